@@ -19,18 +19,26 @@
 # ------------------------------------------------------------
 
 import os, json
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from pydantic import ValidationError
 
 # We keep using your prompt loader utilities
 from app.models.reasoning import ReasoningResponse
 from app.utils.prompt_loader import load_prompt, render_prompt
 
-# One shared async client (key from env)
+# One shared async client (key from env) over a keep-alive connection pool,
+# so every summary turn reuses warm TCP/TLS connections to the API.
 # We’ll also assign it to self.client inside the class for clarity/consistency
-_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=100),
+    ),
+)
 
 
 # --------------------------
@@ -62,6 +70,10 @@ class ReasoningClient:
         # Use a single client instance
         self.client = _client
 
+    async def aclose(self) -> None:
+        """Close the shared HTTP pool (app shutdown)."""
+        await self.client.close()
+
     # ------------------------------------------------------------
     # Generic reasoning (legacy/fallback) — kept intact for now
     # ------------------------------------------------------------
@@ -322,3 +334,52 @@ class ReasoningClient:
             "confidence": confidence,
             "suggested_actions": suggested
         }
+
+    # ------------------------------------------------------------
+    # History memory — fold older turns into a running summary
+    # ------------------------------------------------------------
+    async def summarize_turns(
+        self,
+        turns: list,               # list of MessageTurn (older slice only)
+        *,
+        previous_summary: str = "",
+    ) -> str:
+        """
+        Compress older turns (plus the previous summary) into one short
+        history summary, so /reply only sends recent turns verbatim.
+        Returns the new summary text ("" if the model returned nothing).
+        """
+        system_prompt = load_prompt("summary_history.system.txt")
+        user_template = load_prompt("summary_history.user.txt")
+
+        user_prompt = render_prompt(
+            user_template,
+            turns=_pack_turns(turns, limit=len(turns)),
+            previous_summary=previous_summary or "(none)",
+        )
+
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            temperature=0.2,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_prompt.strip()},
+                {"role": "user", "content": user_prompt.strip()},
+            ],
+        )
+
+        js = _safe_json_loads(response.choices[0].message.content)
+        summary = str(js.get("summary") or "").strip()
+
+        print(f"[HISTORY] folded {len(turns)} turns -> {len(summary)} chars")
+
+        return summary
+
+
+@lru_cache(maxsize=1)
+def get_reasoning_client() -> ReasoningClient:
+    """
+    Process-wide ReasoningClient shared by the routes/services.
+    Cached so the prompt is loaded once; tests can swap it via cache_clear().
+    """
+    return ReasoningClient()
@@ -61,3 +61,18 @@ app.include_router(realtime_ws.router)
 app.include_router(db_proxy.router, tags=["database"])
 app.include_router(db_test.router, tags=["database"])
 app.include_router(visits.router, prefix="/visits", tags=["visits"])
+
+
+# --- Shutdown -------------------------------------------------------------
+from app.clients.reasoning_client import get_reasoning_client
+from app.services import db_writer, visit_writer
+
+
+@app.on_event("shutdown")
+async def _close_http_clients() -> None:
+    # Pooled outbound clients live for the whole process; release them here.
+    await db_writer.aclose()
+    await visits.visit_logger.aclose()
+    await visit_writer.visit_logger.aclose()
+    await get_reasoning_client().aclose()
+
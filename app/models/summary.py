@@ -77,13 +77,14 @@ class SummaryStartResponse(BaseModel):
     - patient_id:   Echo of input for client convenience.
     - doctor_id:    Echo of input for client convenience.
     - started_at:   UTC timestamp when session was created.
-    - status:       Current session state: collecting | finalized | saved.
+    - status:       Current session state: collecting | finalized | saved,
+                    or 'warming' while the snapshot is still being built.
     """
     session_id : str
     patient_id: int
     doctor_id: Optional[str] = None
     started_at: datetime
-    status: Literal["collecting", "finalized", "saved"] = "collecting"
+    status: Literal["warming", "collecting", "finalized", "saved"] = "collecting"
 
 class SummaryMessageRequest(BaseModel):
     """
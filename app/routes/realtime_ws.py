@@ -7,12 +7,16 @@ from typing import Dict, Any, Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Body
 from fastapi.responses import JSONResponse
+import orjson
 import websockets
 
 # ---------- Config ----------
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 REALTIME_MODEL = os.getenv("REALTIME_MODEL", "gpt-4o-realtime-preview-2024-12-17")
 REALTIME_VOICE = os.getenv("REALTIME_VOICE", "verse")
+# Pretty-print the snapshot injected into the model (debug only; compact otherwise)
+DEBUG_SNAPSHOT = os.getenv("DEBUG_SNAPSHOT", "").lower() in {"1", "true", "yes"}
+_SNAPSHOT_OPTS = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if DEBUG_SNAPSHOT else 0)
 
 # Prompt load (session instructions)
 from pathlib import Path
@@ -35,6 +39,116 @@ print(
 
 router = APIRouter()
 
+# Upstream connect target; built once per process rather than per browser connection.
+# NOTE: upstream sockets are deliberately *not* pooled/reused across browser sessions.
+# A Realtime connection carries its own conversation state (system prompt, snapshot,
+# patient turns) and there is no reset for it, so handing one to another doctor would
+# leak the previous patient's context.
+_UPSTREAM_URL = f"wss://api.openai.com/v1/realtime?model={REALTIME_MODEL}"
+_UPSTREAM_HEADERS = [
+    ("Authorization", f"Bearer {OPENAI_API_KEY}"),
+    ("OpenAI-Beta", "realtime=v1"),
+]
+
+# ---------- Static upstream frames ----------
+# Built and serialized once at import (everything here depends only on env + PROMPT_TEXT),
+# so a new browser connection sends ready-made text frames instead of rebuilding them.
+def _response_create_msg(instructions: str, modalities=("audio", "text")) -> str:
+    return orjson.dumps({
+        "type": "response.create",
+        "response": {
+            "modalities": list(modalities),
+            "instructions": instructions
+        }
+    }).decode()
+
+
+# Initial session.update (modalities, voice, formats, VAD, tools, instructions)
+_INITIAL_SESSION = {
+    "type": "session.update",
+    "session": {
+        "modalities": ["text", "audio"],
+        "voice": REALTIME_VOICE,
+        "input_audio_format": "pcm16",
+        "output_audio_format": "pcm16",
+        "input_audio_transcription": {"model": "whisper-1"},
+        # Stronger VAD to prevent re-entrant turns while speaking
+        "turn_detection": {
+            "type": "server_vad",
+            "threshold": 0.90,
+            "silence_duration_ms": 1500,
+            "prefix_padding_ms": 170
+        },
+        "temperature": 0.6,
+        "tool_choice": "auto",
+        "tools": [
+            {
+                "type": "function",
+                "name": "save_observation",
+                "description": "Persist the current observation/notes for this session to storage.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "session_id": {"type": "string"},
+                        "notes": {"type": "string"}
+                    },
+                    "required": ["session_id", "notes"]
+                }
+            },
+            {
+                "type": "function",
+                "name": "finalize_soap",
+                "description": "Synthesize a SOAP draft from the current working notes for physician review.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "session_id": {"type": "string"},
+                        "notes": {
+                            "type": "string",
+                            "description": "Optional recap of the latest findings to feed into the SOAP draft."
+                        }
+                    },
+                    "required": ["session_id"]
+                }
+            }
+        ],
+        "instructions": PROMPT_TEXT,
+    },
+}
+
+# STRONG PIN: the prompt as a system message in the conversation state
+_SYSTEM_PROMPT_ITEM = {
+    "type": "conversation.item.create",
+    "item": {
+        "type": "message",
+        "role": "system",
+        "content": [
+            {"type": "input_text", "text": PROMPT_TEXT}
+        ]
+    }
+}
+
+_INITIAL_SESSION_MSG = orjson.dumps(_INITIAL_SESSION).decode()
+_SYSTEM_PROMPT_MSG = orjson.dumps(_SYSTEM_PROMPT_ITEM).decode()
+_ROLE_ACK_MSG = _response_create_msg("ROLE-ACK: supervised intake agent.", modalities=("text", "audio"))
+
+
+# Fixed nudges/acks sent on tool calls and transcript claims (pre-serialized once)
+_SAVED_ACK_MSG = _response_create_msg("saved", modalities=("audio",))
+_SOAP_READY_MSG = _response_create_msg(
+    "Doctor, the SOAP draft is ready. "
+    "Let me know if you need revisions or another pass."
+)
+_SAVE_REMINDER_MSG = _response_create_msg(
+    "I have not called save_observation yet. I must call the save_observation tool now "
+    "so your notes appear."
+)
+_FINALIZE_REMINDER_MSG = _response_create_msg(
+    "I must call save_observation with the latest notes, then call finalize_soap. "
+    "Running those tools now."
+)
+
+
 # ---------- In-memory stores (MVP) ----------
 # Tools are the only writers to these now.
 LIVE_OBSERVATION: Dict[str, str] = {}         # session_id -> observation text (save_observation)
@@ -44,6 +158,26 @@ SESSION_FLAGS: Dict[str, Dict[str, Any]] = {} # per-session state (e.g., finaliz
 
 MAX_NOTES_LEN = 12000  # kept for compatibility
 
+# Upstream tool-call event types, matched exactly (one hash lookup per event).
+_TOOL_DELTA_TYPES = frozenset({
+    "response.function_call_arguments.delta",
+    "response.tool_call.arguments.delta",
+    "response.output_item.delta",
+})
+_TOOL_DONE_TYPES = frozenset({
+    "response.function_call_arguments.done",
+    "response.tool_call.arguments.done",
+    "response.output_item.done",
+})
+
+_TRANSCRIPT_TYPES = frozenset({
+    "response.audio_transcript.delta",
+    "response.audio_transcript.done",
+})
+
+# One case-insensitive pass over each transcript chunk for "I saved/finalized" claims.
+_TOOL_CLAIM_RE = re.compile(r"save_observation|finalize_soap", re.IGNORECASE)
+
 def _normalize_live(text: str) -> str:
     if text is None:
         return ""
@@ -56,14 +190,9 @@ def _normalize_live(text: str) -> str:
 def _content_to_text(content: Any) -> str:
     if not isinstance(content, list):
         return ""
-    parts = []
-    for block in content:
-        if not isinstance(block, dict):
-            continue
-        text = block.get("text")
-        if text:
-            parts.append(str(text))
-    return "\n".join(parts).strip()
+    return "\n".join(
+        str(block["text"]) for block in content if type(block) is dict and block.get("text")
+    ).strip()
 
 
 def _coerce_patient_id(value: Any) -> Optional[int]:
@@ -95,15 +224,13 @@ def _ingest_conversation_item(session_id: str, item: Dict[str, Any]) -> None:
 async def _send_snapshot_to_model(oa_ws, session_id: str, snapshot: Dict[str, Any], patient_id: Optional[str]) -> None:
     if not snapshot:
         return
-    try:
-        snapshot_text = json.dumps(snapshot, indent=2)
-    except Exception:
-        snapshot_text = str(snapshot)
+    # Raises orjson.JSONEncodeError on unserializable data; caller reports it.
+    snapshot_text = orjson.dumps(snapshot, option=_SNAPSHOT_OPTS).decode()
     header = f"Patient Snapshot (session {session_id})"
     if patient_id:
         header = f"Patient Snapshot (patient {patient_id})"
     message = f"{header}:\n{snapshot_text}"
-    await oa_ws.send(json.dumps({
+    await oa_ws.send(orjson.dumps({
         "type": "conversation.item.create",
         "item": {
             "type": "message",
@@ -112,7 +239,7 @@ async def _send_snapshot_to_model(oa_ws, session_id: str, snapshot: Dict[str, An
                 {"type": "input_text", "text": message}
             ]
         }
-    }))
+    }).decode())
 
 
 async def _initialize_summary_context(session_id: str, ctx: Dict[str, Any], oa_ws, browser_ws) -> None:
@@ -134,7 +261,7 @@ async def _initialize_summary_context(session_id: str, ctx: Dict[str, Any], oa_w
     # Fetch snapshot if not provided and patient id exists
     if snapshot is None and patient_id is not None:
         try:
-            snapshot = await build_snapshot(patient_id)
+            snapshot = await build_snapshot_cached(patient_id)
         except Exception as e:
             await browser_ws.send_text(json.dumps({
                 "type": "session.context.error",
@@ -168,7 +295,8 @@ async def _initialize_summary_context(session_id: str, ctx: Dict[str, Any], oa_w
         tool_handlers.set_notes(session_id, preload_notes)
         normalized = tool_handlers.get_notes(session_id)
         set_working_notes(session_id, normalized)
-        LIVE_OBSERVATION[session_id] = _normalize_live(normalized)
+        # Already normalized + capped by the tool handlers; strip only trims a capped edge.
+        LIVE_OBSERVATION[session_id] = normalized.strip()
 
     flags.update({
         "patient_id": summary.patient_id,
@@ -180,8 +308,15 @@ async def _initialize_summary_context(session_id: str, ctx: Dict[str, Any], oa_w
     })
 
     if summary.snapshot and not flags.get("snapshot_sent"):
-        await _send_snapshot_to_model(oa_ws, session_id, summary.snapshot, summary.patient_id)
-        flags["snapshot_sent"] = True
+        try:
+            await _send_snapshot_to_model(oa_ws, session_id, summary.snapshot, summary.patient_id)
+            flags["snapshot_sent"] = True
+        except orjson.JSONEncodeError as e:
+            await browser_ws.send_text(json.dumps({
+                "type": "session.context.error",
+                "session_id": session_id,
+                "message": f"Snapshot could not be serialized for the model: {e}"
+            }))
 
     await browser_ws.send_text(json.dumps({
         "type": "session.context.ready",
@@ -199,7 +334,7 @@ from app.services.summary_session import (
     add_doctor_message,
     add_assistant_reply,
 )
-from app.services.snapshot_builder import build_snapshot
+from app.services.snapshot_builder import build_snapshot_cached
 
 
 async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session_id: str) -> bool:
@@ -211,11 +346,7 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
     ev_type = ev.get("type", "")
 
     # Arguments streaming (two common shapes)
-    if (
-        ev_type.endswith("arguments.delta")
-        or ev_type.endswith("tool_call.arguments.delta")
-        or ev_type.endswith("output_item.delta")
-    ):
+    if ev_type in _TOOL_DELTA_TYPES:
         call_id = ev.get("call_id") or ev.get("tool_call_id")
         delta = ev.get("delta") or ""
         name = ev.get("name")
@@ -230,11 +361,7 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
         return True
 
     # Arguments done → dispatch tool
-    if (
-        ev_type.endswith("arguments.done")
-        or ev_type.endswith("tool_call.arguments.done")
-        or ev_type.endswith("output_item.done")
-    ):
+    if ev_type in _TOOL_DONE_TYPES:
         call_id = ev.get("call_id") or ev.get("tool_call_id")
         name = ev.get("name")
         args_json = None
@@ -273,17 +400,19 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
                 session_id=sid_arg,
                 notes=args.get("notes", "")
             )
-            obs = result.get("observation") or result.get("notes") or ""
-            LIVE_OBSERVATION[sid_arg] = _normalize_live(obs)
+            # The handler output is already normalized + capped; reuse it instead of
+            # running the paragraph/whitespace regex passes a second time.
+            obs = (result.get("observation") or result.get("notes") or "").strip()
+            LIVE_OBSERVATION[sid_arg] = obs
             SESSION_FLAGS.setdefault(sid_arg, {}).update({"recent_save": True})
-            tiny_ack = "saved"
-            print(f"[TOOLS] save_observation stored len={len(LIVE_OBSERVATION[sid_arg])}")
+            tiny_ack = _SAVED_ACK_MSG
+            print(f"[TOOLS] save_observation stored len={len(obs)}")
 
             ui_event_payload = {
                 "type": "ui.observation.preview",
                 "session_id": sid_arg,
-                "notes": LIVE_OBSERVATION[sid_arg],
-                "observation": LIVE_OBSERVATION[sid_arg],
+                "notes": obs,
+                "observation": obs,
                 "message": result.get("message", ""),
             }
 
@@ -305,16 +434,7 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
 
             # Let the doctor know the draft is ready; model stays available for follow-up.
             try:
-                await oa_ws.send(json.dumps({
-                    "type": "response.create",
-                    "response": {
-                        "modalities": ["audio", "text"],
-                        "instructions": (
-                            "Doctor, the SOAP draft is ready. "
-                            "Let me know if you need revisions or another pass."
-                        )
-                    }
-                }))
+                await oa_ws.send(_SOAP_READY_MSG)
             except Exception:
                 pass
 
@@ -331,20 +451,22 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
                 except Exception:
                     fallback_notes = ""
                 if fallback_notes:
-                    LIVE_OBSERVATION[session_id] = _normalize_live(fallback_notes)
+                    LIVE_OBSERVATION[session_id] = fallback_notes.strip()
                     print(f"[TOOLS] finalize_soap backfilled live notes len={len(LIVE_OBSERVATION[session_id])}")
 
-        # Send tool output upstream using conversation.item.create
+        # Send tool output upstream using conversation.item.create.
+        # The protocol wants `output` as a JSON string; both encodes go through orjson
+        # and the frame is sent as text (decoded), since the upstream expects text frames.
         tool_output_msg = {
             "type": "conversation.item.create",
             "item": {
                 "type": "function_call_output",
                 "call_id": call_id,
-                "output": json.dumps(result),
+                "output": orjson.dumps(result).decode(),
             },
         }
         print(f"[TOOLS] output     name={name} call_id={call_id} -> {result}")
-        await oa_ws.send(json.dumps(tool_output_msg))
+        await oa_ws.send(orjson.dumps(tool_output_msg).decode())
 
         if ui_event_payload:
             try:
@@ -355,13 +477,7 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
         # Tiny audio ack only for save_observation (SOAP already got an explicit pause message)
         if tiny_ack:
             try:
-                await oa_ws.send(json.dumps({
-                    "type": "response.create",
-                    "response": {
-                        "modalities": ["audio"],
-                        "instructions": tiny_ack
-                    }
-                }))
+                await oa_ws.send(tiny_ack)
             except Exception as e:
                 print(f"[TOOLS] ack send failed: {e}")
 
@@ -371,13 +487,41 @@ async def _handle_tool_call_event(ev: Dict[str, Any], oa_ws, browser_ws, session
     return False
 
 
+async def _nudge_unbacked_tool_claims(oa_ws, session_id: str, transcript: str) -> None:
+    """
+    If the model *says* it saved/finalized without having called the tool,
+    prompt it to actually run the tool so the UI gets the data.
+    """
+    claims = {m.lower() for m in _TOOL_CLAIM_RE.findall(transcript)}
+    if not claims:
+        return
+    flags = SESSION_FLAGS.setdefault(session_id, {
+        "finalized_once": False,
+        "recent_save": False,
+        "summary_ready": False,
+        "snapshot_sent": False,
+    })
+    if "save_observation" in claims and not flags.get("recent_save"):
+        print(f"[TOOLS] transcript claim without save_observation; prompting save (session={session_id})")
+        try:
+            await oa_ws.send(_SAVE_REMINDER_MSG)
+        except Exception:
+            pass
+    if "finalize_soap" in claims and not flags.get("finalized_once"):
+        print(f"[TOOLS] transcript claim without finalize_soap; prompting tool call (session={session_id})")
+        try:
+            await oa_ws.send(_FINALIZE_REMINDER_MSG)
+        except Exception:
+            pass
+
+
 # ---------- Live Notes REST Endpoints ----------
 @router.get("/realtime/live-notes")
 async def get_live_notes(session_id: str = Query(..., description="Session ID from session.id event")):
     obs = LIVE_OBSERVATION.get(session_id, "")
     if not obs:
         try:
-            obs = _normalize_live(tool_handlers.get_notes(session_id))
+            obs = tool_handlers.get_notes(session_id).strip()
         except Exception:
             obs = ""
     return {
@@ -431,15 +575,11 @@ async def realtime_ws(websocket: WebSocket):
     print(f"[WS] new session_id={session_id}")
     await websocket.send_text(json.dumps({"type": "session.id", "session_id": session_id}))
 
-    # Connect upstream to OpenAI Realtime WS
-    url = f"wss://api.openai.com/v1/realtime?model={REALTIME_MODEL}"
+    # Connect upstream to OpenAI Realtime WS (one per browser session; see _UPSTREAM_URL)
     try:
         oa_ws = await websockets.connect(
-            url,
-            extra_headers=[
-                ("Authorization", f"Bearer {OPENAI_API_KEY}"),
-                ("OpenAI-Beta", "realtime=v1"),
-            ],
+            _UPSTREAM_URL,
+            extra_headers=_UPSTREAM_HEADERS,
             max_size=20_000_000,
             ping_interval=20,
             ping_timeout=20,
@@ -449,84 +589,15 @@ async def realtime_ws(websocket: WebSocket):
         await websocket.close()
         return
 
-    # Send initial session.update (modalities, voice, formats, VAD, tools, instructions)
-    initial_session = {
-        "type": "session.update",
-        "session": {
-            "modalities": ["text", "audio"],
-            "voice": REALTIME_VOICE,
-            "input_audio_format": "pcm16",
-            "output_audio_format": "pcm16",
-            "input_audio_transcription": {"model": "whisper-1"},
-            # Stronger VAD to prevent re-entrant turns while speaking
-            "turn_detection": {
-                "type": "server_vad",
-                "threshold": 0.90,
-                "silence_duration_ms": 1500,
-                "prefix_padding_ms": 170
-            },
-            "temperature": 0.6,
-            "tool_choice": "auto",
-            "tools": [
-                {
-                    "type": "function",
-                    "name": "save_observation",
-                    "description": "Persist the current observation/notes for this session to storage.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "session_id": {"type": "string"},
-                            "notes": {"type": "string"}
-                        },
-                        "required": ["session_id", "notes"]
-                    }
-                },
-                {
-                    "type": "function",
-                    "name": "finalize_soap",
-                    "description": "Synthesize a SOAP draft from the current working notes for physician review.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "session_id": {"type": "string"},
-                            "notes": {
-                                "type": "string",
-                                "description": "Optional recap of the latest findings to feed into the SOAP draft."
-                            }
-                        },
-                        "required": ["session_id"]
-                    }
-                }
-            ],
-            "instructions": PROMPT_TEXT,
-        },
-    }
-
     # Defensive: send session.update twice to avoid first-turn race
-    await oa_ws.send(json.dumps(initial_session))
-    await oa_ws.send(json.dumps(initial_session))
+    await oa_ws.send(_INITIAL_SESSION_MSG)
+    await oa_ws.send(_INITIAL_SESSION_MSG)
 
     # STRONG PIN: Inject the prompt as a system message in the conversation state
-    system_item = {
-        "type": "conversation.item.create",
-        "item": {
-            "type": "message",
-            "role": "system",
-            "content": [
-                {"type": "input_text", "text": PROMPT_TEXT}
-            ]
-        }
-    }
-    await oa_ws.send(json.dumps(system_item))
+    await oa_ws.send(_SYSTEM_PROMPT_MSG)
 
     # Optional: brief role acknowledgement
-    await oa_ws.send(json.dumps({
-        "type": "response.create",
-        "response": {
-            "modalities": ["text", "audio"],
-            "instructions": "ROLE-ACK: supervised intake agent."
-        }
-    }))
+    await oa_ws.send(_ROLE_ACK_MSG)
 
     # ------------ Bridge coroutines ------------
     async def from_browser_to_openai():
@@ -590,66 +661,31 @@ async def realtime_ws(websocket: WebSocket):
 
                 # IMPORTANT: Do NOT append transcript/text deltas to live notes anymore.
                 # Only tools (save_observation/finalize_soap) write to LIVE_OBSERVATION/LIVE_SOAP.
+                ev_type = ev.get("type") if isinstance(ev, dict) else None
 
                 # Intercept tool calls; if handled, don't forward to browser
-                try:
-                    swallow = await _handle_tool_call_event(ev, oa_ws, websocket, session_id)
-                    if swallow:
-                        continue
-                except Exception:
-                    # fail-soft; keep relay going
-                    pass
-
-                try:
-                    if ev.get("type") == "conversation.item.create":
+                if ev_type in _TOOL_DELTA_TYPES or ev_type in _TOOL_DONE_TYPES:
+                    try:
+                        if await _handle_tool_call_event(ev, oa_ws, websocket, session_id):
+                            continue
+                    except Exception as e:
+                        # fail-soft; keep relay going
+                        print(f"[TOOLS] handler failed type={ev_type}: {e}")
+
+                elif ev_type == "conversation.item.create":
+                    try:
                         _ingest_conversation_item(session_id, ev.get("item"))
-                except Exception:
-                    pass
-
-                try:
-                    flags = SESSION_FLAGS.setdefault(session_id, {
-                        "finalized_once": False,
-                        "recent_save": False,
-                        "summary_ready": False,
-                        "snapshot_sent": False,
-                    })
-                    if ev.get("type") in ("response.audio_transcript.delta", "response.audio_transcript.done"):
-                        transcript = (ev.get("delta") or ev.get("transcript") or "").lower()
-                        if transcript:
-                            if "save_observation" in transcript and not flags.get("recent_save"):
-                                msg = (
-                                    "I have not called save_observation yet. I must call the save_observation tool now "
-                                    "so your notes appear."
-                                )
-                                print(f"[TOOLS] transcript claim without save_observation; prompting save (session={session_id})")
-                                try:
-                                    await oa_ws.send(json.dumps({
-                                        "type": "response.create",
-                                        "response": {
-                                            "modalities": ["audio", "text"],
-                                            "instructions": msg
-                                        }
-                                    }))
-                                except Exception:
-                                    pass
-                            if "finalize_soap" in transcript and not flags.get("finalized_once"):
-                                reminder = (
-                                    "I must call save_observation with the latest notes, then call finalize_soap. "
-                                    "Running those tools now."
-                                )
-                                print(f"[TOOLS] transcript claim without finalize_soap; prompting tool call (session={session_id})")
-                                try:
-                                    await oa_ws.send(json.dumps({
-                                        "type": "response.create",
-                                        "response": {
-                                            "modalities": ["audio", "text"],
-                                            "instructions": reminder
-                                        }
-                                    }))
-                                except Exception:
-                                    pass
-                except Exception:
-                    pass
+                    except Exception as e:
+                        # bookkeeping only; never drop the relay over it
+                        print(f"[INGEST] failed for session={session_id}: {e}")
+
+                elif ev_type in _TRANSCRIPT_TYPES:
+                    transcript = ev.get("delta") or ev.get("transcript") or ""
+                    if transcript:
+                        try:
+                            await _nudge_unbacked_tool_claims(oa_ws, session_id, transcript)
+                        except Exception as e:
+                            print(f"[NUDGE] failed for session={session_id}: {e}")
 
                 # Relay everything else to browser
                 await websocket.send_text(json.dumps(ev))
@@ -1,13 +1,14 @@
 # app/routes/reasoning.py
+import asyncio
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Any, Dict
-from app.clients.reasoning_client import ReasoningClient
+from app.clients.reasoning_client import get_reasoning_client
 from app.utils.prompt_loader import load_system_prompt, load_task_prompt, render_prompt
-from app.services.snapshot_builder import build_snapshot
+from app.services.snapshot_builder import build_snapshot_cached
 
 router = APIRouter()
-client = ReasoningClient()
+client = get_reasoning_client()
 class PreviewIn(BaseModel):
     task: str
     transcript: str
@@ -15,7 +16,7 @@ class PreviewIn(BaseModel):
     language: str = "en"
 
 @router.post("/preview")
-def preview_reasoning(body: PreviewIn): #return final structured prompt first. 
+async def preview_reasoning(body: PreviewIn): #return final structured prompt first. 
     """
     Endpoint to preview the composed prompt for a given task and context.
     This helps in debugging and understanding what is sent to the LLM.
@@ -30,7 +31,8 @@ def preview_reasoning(body: PreviewIn): #return final structured prompt first.
             "language": body.language
         }
 
-        prompt = render_prompt(system, task, context)
+        # Templating over a large EHR payload is CPU work; keep it off the event loop.
+        prompt = await asyncio.to_thread(render_prompt, system, task, context)
         return {"composed_prompt": prompt}
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -61,7 +63,7 @@ async def test_placeholders(body: PromptTestIn):
     """
     try:
         # 1. Fetch snapshot for this patient
-        snapshot = await build_snapshot(body.patient_id)
+        snapshot = await build_snapshot_cached(body.patient_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"EHR fetch failed: {e}")
 
@@ -71,13 +73,14 @@ async def test_placeholders(body: PromptTestIn):
         task = load_task_prompt(body.task)
 
         # 3. Render prompt with transcript + snapshot
-        prompt = render_prompt(
+        prompt = await asyncio.to_thread(
+            render_prompt,
             system,
             task,
-            context={
+            {
                 "transcript": body.transcript,
                 "ehr_json": snapshot
-            }
+            },
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prompt error: {e}")
@@ -99,7 +102,7 @@ async def run_reasoning(body: RunReasoningIn):
     """
 
     try:
-        snapshot = await build_snapshot(body.patient_id)
+        snapshot = await build_snapshot_cached(body.patient_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"EHR snapshot fetch failed: {e}")
 
@@ -8,48 +8,63 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import re
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Response
 from typing import Optional, List, Literal, Dict, Any
 from app.models.summary import SummaryStartRequest, SummaryStartResponse, SummaryMessageRequest, SummaryMessageResponse,ResponseEnvelope, SummaryFinalizeRequest, ObjectiveRequest #add envelope
-from app.services.snapshot_builder import build_snapshot
+from app.services.snapshot_builder import build_snapshot_cached
 from app.services.summary_session import create_session, get_session, add_doctor_message, add_assistant_reply, mark_finalized, mark_saved
 from app.utils.time import now_et
-from app.clients.reasoning_client import ReasoningClient
+from app.clients.reasoning_client import get_reasoning_client
 from app.services.visit_writer import save_visit_if_ready
 from pydantic import BaseModel, Field
 
 
 router = APIRouter()
-reason_client = ReasoningClient()
+reason_client = get_reasoning_client()
+
+# Demo "force" triggers in /run (plain substring match, case-insensitive)
+_FORCE_OBJECTIVE_RE = re.compile(r"show objective|preview objective|objective please", re.IGNORECASE)
+_FORCE_FINALIZE_RE = re.compile(r"show soap|preview soap|soap please|finalize", re.IGNORECASE)
+
+# Default suggested_actions, shared across requests. Lists (the envelope field
+# is List[str] and model_construct skips coercion); never mutate them.
+_PREVIEW_ACTIONS = ["approve_save", "reject_save"]
+_CHAT_ACTIONS = ["keep_discussing"]
+_NO_ACTIONS: list = []
+
+# Envelopes below are built from server-side values (reasoning client output is
+# already normalized), so they use model_construct() and skip re-validation;
+# response_model still checks the shape on the way out.
 
 
 @router.post("/start", response_model=SummaryStartResponse)
 async def start_summary(body: SummaryStartRequest) -> SummaryStartResponse:
     '''Flow:
     1) Validate input (pydantic model already validated types/required fields).
-    2) Fetch snapshot once via build_snapshot(patient_id).
-    3) Create an in-memory session with the snapshot, consent, locale, doctor_id.
-    4) Return a SummaryStartResponse with session_id and 'collecting' status. '''
+    2) Create an in-memory session with consent, locale, doctor_id.
+    3) Warm the snapshot in the background (build_snapshot_cached(patient_id));
+       endpoints that need it wait for it (see _session_snapshot).
+    4) Return a SummaryStartResponse with session_id and 'warming' status. '''
     # Step 1: Validate input (pydantic already validated types/required fields).
     patient_id = body.patient_id
     doctor_id = body.doctor_id
     locale = body.locale or "en"
     consent = bool(body.consent)
 
-    # Step 2: Fetch snapshot once via build_snapshot(patient_id).
-    try:
-        snapshot = await build_snapshot(patient_id)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error building snapshot: {e}")
-    
-    # Step 3: Create an in-memory session with the snapshot, consent, locale, doctor_id.
+    # Step 2: Create an in-memory session with consent, locale, doctor_id.
     sess = create_session(
             patient_id=patient_id,
             doctor_id=doctor_id,
             locale=locale,
             consent=consent,
-            snapshot=snapshot
+            snapshot={}
         )
+
+    # Step 3: Snapshot I/O overlaps with the doctor typing the first message.
+    sess.start_snapshot_warm(build_snapshot_cached)
+
     # 4) Respond with the agreed contract (SummaryStartResponse)
     # FastAPI will serialize this back to JSON for the client.
     return SummaryStartResponse(
@@ -57,25 +72,28 @@ async def start_summary(body: SummaryStartRequest) -> SummaryStartResponse:
         patient_id=sess.patient_id,
         doctor_id=sess.doctor_id,
         started_at=sess.started_at,
-        status=sess.status,  # "collecting"
+        status="warming",  # session itself is "collecting"
     )
 
 
-def _pack_context(turns, max_chars: int = 8000) -> str: #latest conversation packaging for reasoning model
+def _session_or_404(session_id: str):
+    try:
+        return get_session(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+
+async def _session_snapshot(sess) -> dict:
     """
-    context packer:
-    - Take the last N turns and flatten to text lines: 'Doctor: ...' / 'Assistant: ...'
-    - Trim from the front to stay under a conservative char budget.
+    Wait (bounded) for the snapshot warmed by /start.
+    504 if it's still not ready, 500 if building it failed.
     """
-    lines: List[str] = []
-    for t in turns[-20:]:  # last 20 turns of conversation 
-        who = "Doctor" if t.role == "doctor" else "Assistant"
-        lines.append(f"{who}: {t.content}")
-    ctx = "\n".join(lines).strip()
-    if len(ctx) > max_chars:
-        ctx = ctx[-max_chars:]
-    return ctx
-
+    try:
+        return await sess.wait_snapshot()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Snapshot still warming; try again")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building snapshot: {e}")
 
 
 @router.post("/message", response_model=SummaryMessageResponse)
@@ -97,7 +115,7 @@ async def add_message(body: SummaryMessageRequest) -> SummaryMessageResponse:
         raise HTTPException(status_code=404, detail="Session not found")
 
     # 2️⃣ Count how many doctor messages exist (not assistant)
-    total_doctor_msgs = sum(1 for t in sess.turns if t.role == "doctor")
+    total_doctor_msgs = sess.doctor_msg_count
 
     # 3️⃣ Return the response model
     return SummaryMessageResponse(
@@ -109,6 +127,16 @@ async def add_message(body: SummaryMessageRequest) -> SummaryMessageResponse:
 
 @router.post("/reply", response_model=ResponseEnvelope)
 async def summary_reply(body: SummaryMessageRequest) -> ResponseEnvelope:
+    """
+    Single-flight wrapper: an identical /reply already in flight for this
+    session (double click, client retry) shares its result instead of
+    appending the turn twice and paying for a second LLM call.
+    """
+    sess = _session_or_404(body.session_id)
+    return await sess.single_flight(("reply", body.text), lambda: _summary_reply(body))
+
+
+async def _summary_reply(body: SummaryMessageRequest) -> ResponseEnvelope:
     '''Flow:
 
         Doctor sends a short message; agent responds with speech_output.
@@ -116,60 +144,40 @@ async def summary_reply(body: SummaryMessageRequest) -> ResponseEnvelope:
       
     1) Validate input (pydantic already validated types/required fields).
     2) Fetch the session by session_id, raise 404 if not found.
-    3) Append the doctor's message to the session.
+    3) Wait for the snapshot, then append the doctor's message to the session.
     4) Pack recent conversation context within a char limit.
     5) Call the reasoning client with the context and snapshot.
     6) Append the assistant's reply to the session.
     7) Return a ResponseEnvelope with the assistant's reply and reasoning data.'''
 
-# 1) Append the doctor turn (404 if the session doesn't exist)
-    try:
-        sess = add_doctor_message(body.session_id, body.text, modality="text")
-    except KeyError:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
+# 1) Wait for the snapshot first: a 504/500 here must not leave the doctor
+#    turn in the history (a retry would then append it twice)
+    sess = _session_or_404(body.session_id)
+    snapshot = await _session_snapshot(sess)
+    add_doctor_message(body.session_id, body.text, modality="text")
 
 # 2) Build a small context window + include the snapshot
-    context_text = _pack_context(sess.turns)
-    snapshot = sess.snapshot
+    context_text = sess.pack_context(max_chars=8000)
     locale = sess.locale
+    # Fold older turns into the history summary in the background (no-op until the session is long)
+    sess.maybe_refresh_history(reason_client.summarize_turns)
 
-# 3) Call reasoning client (doctor-support persona)
-    # Prefer a dedicated method. If you don't have it yet, still have something to  fall back on
-
+# 3) Call reasoning client (doctor-support persona) — always returns a normalized dict
     try:
-        
         reply = await reason_client.generate_summary_reply(
             context=context_text,
             snapshot=snapshot,
             locale=locale,
         )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reasoning failed: {e}")
+
+    # Expected fields: speech_output (str), intent (str), confidence (float), suggested_actions (list)
+    speech = reply["speech_output"]
+    intent = reply.get("intent")
+    conf = reply.get("confidence")
+    suggested = reply.get("suggested_actions")
 
-    # Expected fields: speech_output (str), intent (str, optional), confidence (float, optional)
-        speech = reply["speech_output"] if isinstance(reply, dict) else getattr(reply, "speech_output", None)
-        intent = reply.get("intent") if isinstance(reply, dict) else getattr(reply, "intent", None)
-        conf = reply.get("confidence") if isinstance(reply, dict) else getattr(reply, "confidence", None)
-        suggested = reply.get("suggested_actions") if isinstance(reply, dict) else getattr(reply, "suggested_actions", None)
-    
-    except AttributeError:
-        # Fallback path if ReasoningClient doesn't yet have generate_summary_reply()
-        try:
-            # Synchronous or async depending on your client; adjust if needed
-            rr = await reason_client.generate_reasoning(
-                transcript=context_text,
-                snapshot=snapshot,
-                locale=locale,
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Reasoning failed: {e}")
-        # Map minimal fields for our envelope (MVP)
-        speech = getattr(rr, "speech_output", None) or "Noted. What would you like me to clarify next?"
-        intent = getattr(rr, "intent", None) or "answer"
-        conf = getattr(rr, "confidence", None)
-        suggested = getattr(rr, "suggested_actions", None)
-        if suggested is None:
-            suggested = ["present_conclusion", "keep_discussing", "show_soap_preview"]
-        
         # 4) Store the assistant turn and light state
     add_assistant_reply(
         body.session_id,
@@ -180,7 +188,7 @@ async def summary_reply(body: SummaryMessageRequest) -> ResponseEnvelope:
     )
 
     # 5) Return speech-first envelope (no UI in chat turns)
-    return ResponseEnvelope(
+    return ResponseEnvelope.model_construct(
         session_id=body.session_id,
         speech_output=speech,
         show_ui=False,
@@ -193,10 +201,15 @@ async def summary_reply(body: SummaryMessageRequest) -> ResponseEnvelope:
 
 
 @router.post("/finalize", response_model=ResponseEnvelope)
-async def finalize_summary(body: SummaryFinalizeRequest) -> ResponseEnvelope:
+async def finalize_summary(
+    body: SummaryFinalizeRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+) -> ResponseEnvelope:
     """
     Trigger reasoning over the collected notes + snapshot.
-    Returns a SOAP preview (or saves if approve_save=True).
+    Returns a SOAP preview (or, if approve_save=True, starts the save and
+    answers 202 right away; see /status/{session_id}).
     """
     try:
         sess = get_session(body.session_id) # everythning is saved in the session 
@@ -204,11 +217,12 @@ async def finalize_summary(body: SummaryFinalizeRequest) -> ResponseEnvelope:
         raise HTTPException(status_code=404, detail="Session not found")
     
     # 1️⃣ Generate SOAP JSON via reasoning
+    snapshot = await _session_snapshot(sess)
 
     try:
         js = await reason_client.generate_summary_finalize( 
             turns=sess.turns,
-            snapshot=sess.snapshot,
+            snapshot=snapshot,
             locale=sess.locale,
             preview_only=not body.approve_save
         )
@@ -219,7 +233,7 @@ async def finalize_summary(body: SummaryFinalizeRequest) -> ResponseEnvelope:
 
     if not body.approve_save:
         mark_finalized(body.session_id)
-        return ResponseEnvelope(
+        return ResponseEnvelope.model_construct(
             session_id=body.session_id,
             speech_output=js["speech_output"],
             show_ui=True,
@@ -227,30 +241,54 @@ async def finalize_summary(body: SummaryFinalizeRequest) -> ResponseEnvelope:
             turns_appended=0,
             intent="show_preview",
             confidence=js.get("confidence"),
-            suggested_actions=js.get("suggested_actions", ["approve_save", "reject_save"]),
+            suggested_actions=js.get("suggested_actions", _PREVIEW_ACTIONS),
         )
     
-    # 3️⃣ If approved → save to DB via Zara’s service (stub now)
-    try:
-        visit_result = await save_visit_if_ready(sess, js)
-        mark_saved(body.session_id)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"DB save failed: {e}")
-
-
-    return ResponseEnvelope(
+    # 3️⃣ If approved → save to DB via Zara’s service in the background;
+    #    the UI polls /summary/status/{session_id} for the outcome.
+    sess.save_status = "saving"
+    sess.save_result = None
+    background_tasks.add_task(_save_and_mark, sess, js)
+    response.status_code = 202
+
+    return ResponseEnvelope.model_construct(
         session_id=body.session_id,
-        speech_output="SOAP notes saved successfully.",
+        speech_output="Saving SOAP notes.",
         show_ui=False,
-        ui={"visit": visit_result},
+        ui={"save_status": "saving"},
         turns_appended=0,
         intent="confirm_finalize",
         confidence=1.0,
-        suggested_actions=[],
+        suggested_actions=_NO_ACTIONS,
     )
-    
 
 
+async def _save_and_mark(sess, js) -> None:
+    """Background DB write for an approved SOAP; records the outcome on the session."""
+    try:
+        sess.save_result = await save_visit_if_ready(sess, js)
+        mark_saved(sess.session_id)
+        sess.save_status = "saved"
+    except Exception as e:
+        print(f"[FINALIZE] DB save failed for session={sess.session_id}: {e}")
+        sess.save_result = {"error": str(e)}
+        sess.save_status = "error"
+
+
+@router.get("/status/{session_id}")
+async def summary_status(session_id: str) -> Dict[str, Any]:
+    """
+    Poll target after an approved /finalize: session status plus the
+    background save outcome (save_status: saving | saved | error).
+    """
+    sess = _session_or_404(session_id)
+    return {
+        "session_id": session_id,
+        "status": sess.status,
+        "save_status": sess.save_status,
+        "visit": sess.save_result,
+    }
+
 
 @router.post("/objective", response_model=ResponseEnvelope)
 async def generate_objective(body: ObjectiveRequest) -> ResponseEnvelope:
@@ -269,10 +307,11 @@ async def generate_objective(body: ObjectiveRequest) -> ResponseEnvelope:
     
     # 1️⃣ If it's just a preview, generate the Objective and return for review.
     if not body.approve_save:
+        snapshot = await _session_snapshot(sess)
         try:
             js = await reason_client.generate_objective_only(
                 turns=sess.turns,
-                snapshot=sess.snapshot,
+                snapshot=snapshot,
                 locale=sess.locale,
             )
         except Exception as e:
@@ -280,7 +319,7 @@ async def generate_objective(body: ObjectiveRequest) -> ResponseEnvelope:
         
         mark_finalized(body.session_id)  # Mark as finalized for review
 
-        return ResponseEnvelope(
+        return ResponseEnvelope.model_construct(
             session_id=body.session_id,
             speech_output=js["speech_output"],
             show_ui=True,
@@ -288,7 +327,7 @@ async def generate_objective(body: ObjectiveRequest) -> ResponseEnvelope:
             turns_appended=0,
             intent="show_preview",
             confidence=None,
-            suggested_actions=["approve_save", "reject_save"],
+            suggested_actions=_PREVIEW_ACTIONS,
         )
     
     
@@ -299,7 +338,7 @@ async def generate_objective(body: ObjectiveRequest) -> ResponseEnvelope:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB save failed: {e}")
     
-    return ResponseEnvelope(
+    return ResponseEnvelope.model_construct(
         session_id=body.session_id,
         speech_output="Objective section approved and saved for diagnostic processing.",
         show_ui=False,
@@ -307,67 +346,92 @@ async def generate_objective(body: ObjectiveRequest) -> ResponseEnvelope:
         turns_appended=0,
         intent="confirm_finalize",
         confidence=1.0,
-        suggested_actions=[],
+        suggested_actions=_NO_ACTIONS,
     )
 
 
 @router.post("/run", response_model=ResponseEnvelope)
 async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
+    """Single-flight wrapper around _summary_run (same coalescing as /reply)."""
+    sess = _session_or_404(body.session_id)
+    return await sess.single_flight(("run", body.text), lambda: _summary_run(body))
+
+
+async def _summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
     """
     Unified endpoint that routes reasoning based on model intent or doctor instruction.
     Flow:
-      1) Append doctor's message to session (so context includes it).
+      1) Wait for the snapshot, then append doctor's message (so context includes it).
       2) Call reply mini-agent to get speech + intent + confidence.
       3) Branch on intent:
          - propose_objective/objective → generate Objective preview and return ui={"objective": ...}
          - propose_finalize/finalize   → generate SOAP preview and return ui={"soap": ...}
          - else                       → conversational turn only (show_ui=False)
       4) ALSO support simple "force" text triggers for demos (e.g., "preview soap").
+         A forced preview runs concurrently with the reply call and wins over intent.
     """
 
- # 1) Append doctor's message — if session_id invalid, raise 404
-    try:
-        sess = add_doctor_message(body.session_id, body.text, modality="text")
-    except KeyError:
-        raise HTTPException(status_code=404, detail="Session not found")
+ # 1) Snapshot first (404 if session_id invalid); the doctor's message is only
+ #    appended once it's ready, so a 504/500 leaves no half-recorded turn
+    sess = _session_or_404(body.session_id)
+    snapshot = await _session_snapshot(sess)
+    add_doctor_message(body.session_id, body.text, modality="text")
 
-    # Pack latest turns for the model; also load snapshot + locale
-    context_text = _pack_context(sess.turns)
-    snapshot = sess.snapshot
+    # Pack latest turns for the model (now including the new message) + locale
+    context_text = sess.pack_context(max_chars=8000)
     locale = sess.locale
+    # Fold older turns into the history summary in the background (no-op until the session is long)
+    sess.maybe_refresh_history(reason_client.summarize_turns)
 
-
+    # Force triggers via plain text (useful for demos)
+    #     If the doctor types "show objective" or "preview soap", we force that branch.
+    #     Known up front, so the forced preview can run alongside the reply call.
+    force_text = body.text or ""
+    force_objective = _FORCE_OBJECTIVE_RE.search(force_text) is not None
+    force_finalize  = _FORCE_FINALIZE_RE.search(force_text) is not None
 
     # 2) Ask the reply agent what to do next
-    reply = await reason_client.generate_summary_reply(  # use the reply function above and gie it these inputs
+    reply_call = reason_client.generate_summary_reply(  # use the reply function above and gie it these inputs
         context=context_text,
         snapshot=snapshot,
         locale=locale
-    )    
+    )
+    forced_js: Any = None
+    if force_objective or force_finalize:
+        # Branch is already decided: overlap both LLM round-trips in one wall-clock window.
+        forced_call = (
+            reason_client.generate_objective_only(turns=sess.turns, snapshot=snapshot, locale=locale)
+            if force_objective else
+            reason_client.generate_summary_finalize(turns=sess.turns, snapshot=snapshot, locale=locale, preview_only=True)
+        )
+        reply, forced_js = await asyncio.gather(reply_call, forced_call, return_exceptions=True)
+        if isinstance(reply, BaseException):
+            raise reply
+    else:
+        reply = await reply_call
 
     intent = (reply.get("intent") or "answer").lower()   # give us these outputs 
     conf = reply.get("confidence")
     speech = reply.get("speech_output") or "Noted."
-    suggested = reply.get("suggested_actions", [])
+    suggested = reply.get("suggested_actions", _NO_ACTIONS)
 
 
     #debug log for visisbility 
     print(f"[RUN] intent={intent} conf={conf} suggested={suggested}")
 
-     # 2b) Force triggers via plain text (useful for demos)
-    #     If the doctor types "show objective" or "preview soap", we force that branch.
-    force_text = (body.text or "").lower()
-    force_objective = any(k in force_text for k in ["show objective", "preview objective", "objective please"])
-    force_finalize  = any(k in force_text for k in ["show soap", "preview soap", "soap please", "finalize"])
-
-     # 3) Branch: Objective preview
-    if intent in ("propose_objective", "objective") or force_objective:
+     # 3) Branch: Objective preview (a forced trigger wins over the model's intent)
+    if force_objective or (intent in ("propose_objective", "objective") and not force_finalize):
         try:
-            js_obj = await reason_client.generate_objective_only(
-                turns=sess.turns,
-                snapshot=snapshot,
-                locale=locale
-            )
+            if force_objective:
+                js_obj = forced_js
+                if isinstance(js_obj, BaseException):
+                    raise js_obj
+            else:
+                js_obj = await reason_client.generate_objective_only(
+                    turns=sess.turns,
+                    snapshot=snapshot,
+                    locale=locale
+                )
         
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Objective generation failed: {e}")
@@ -383,7 +447,7 @@ async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
         )
 
 
-        return ResponseEnvelope(
+        return ResponseEnvelope.model_construct(
             session_id=body.session_id,
             speech_output=js_obj.get("speech_output") or "Objective prepared for review.",
             show_ui=True,
@@ -391,19 +455,24 @@ async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
             turns_appended=2,  # doctor + assistant
             intent="objective",
             confidence=js_obj.get("confidence"),
-            suggested_actions=js_obj.get("suggested_actions", ["approve_save", "reject_save"]),
+            suggested_actions=js_obj.get("suggested_actions", _PREVIEW_ACTIONS),
         )
 
     
     # 3) Branch: SOAP preview
     if intent in ("propose_finalize", "finalize") or force_finalize:
         try:
-            js_soap = await reason_client.generate_summary_finalize(
-                turns=sess.turns,
-                snapshot=snapshot,
-                locale=locale,
-                preview_only=True
-            )
+            if force_finalize:
+                js_soap = forced_js
+                if isinstance(js_soap, BaseException):
+                    raise js_soap
+            else:
+                js_soap = await reason_client.generate_summary_finalize(
+                    turns=sess.turns,
+                    snapshot=snapshot,
+                    locale=locale,
+                    preview_only=True
+                )
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"SOAP generation failed: {e}")
 
@@ -416,7 +485,7 @@ async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
             intent="finalize"
         )
 
-        return ResponseEnvelope(
+        return ResponseEnvelope.model_construct(
             session_id=body.session_id,
             speech_output=js_soap.get("speech_output") or "SOAP summary prepared for review.",
             show_ui=True,
@@ -424,7 +493,7 @@ async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
             turns_appended=2,  # doctor + assistant
             intent="finalize",
             confidence=js_soap.get("confidence"),
-            suggested_actions=js_soap.get("suggested_actions", ["approve_save", "reject_save"]),
+            suggested_actions=js_soap.get("suggested_actions", _PREVIEW_ACTIONS),
         )
 
     # 4) Default: conversational turn only (no UI preview)
@@ -437,7 +506,7 @@ async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
     )
 
 
-    return ResponseEnvelope(
+    return ResponseEnvelope.model_construct(
         session_id=body.session_id,
         speech_output=speech,
         show_ui=False,
@@ -445,5 +514,5 @@ async def summary_run(body: SummaryMessageRequest) -> ResponseEnvelope:
         turns_appended=2,  # doctor + assistant
         intent=intent or "answer",
         confidence=conf,
-        suggested_actions=suggested or ["keep_discussing"],
+        suggested_actions=suggested or _CHAT_ACTIONS,
     )
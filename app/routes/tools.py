@@ -7,13 +7,16 @@
 #       2) check scope
 #       3) forward to our already-built handlers
 #   - Outputs are strict JSON that match the Realtime tool schemas.
+#     Handlers return plain dicts, so endpoints serialize them with orjson
+#     directly (no response_model / jsonable_encoder pass on this hot path).
 # -------------------------------------------------------------------
 
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 
 from app.utils.auth import verify_tool_jwt
+from app.utils.responses import orjson_response
 from app.services.realtime_tool_handlers import (
     handle_summary_reply,
     handle_summary_objective,
@@ -24,19 +27,28 @@ from app.services.realtime_tool_handlers import (
 router = APIRouter()
 
 # ---- helper ---------------------------------------------------------
-def _require_auth(auth_header: Optional[str], needed_scope: str, session_id: str):
-    if not auth_header or not auth_header.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization Bearer token")
-    token = auth_header.split(" ", 1)[1].strip()
-    try:
-        payload = verify_tool_jwt(token)
-    except ValueError as e:
-        raise HTTPException(status_code=401, detail=f"Auth failed: {e}")
+def require_scope(needed_scope: str):
+    """
+    Dependency factory: verifies Authorization: Bearer <tool_jwt> and the scope,
+    and hands the token payload to the endpoint (which checks the session id).
+    """
+    async def _dep(authorization: Optional[str] = Header(default=None)) -> Dict[str, Any]:
+        if not authorization or not authorization.lower().startswith("bearer "):
+            raise HTTPException(status_code=401, detail="Missing or invalid Authorization Bearer token")
+        token = authorization.split(" ", 1)[1].strip()
+        try:
+            payload = verify_tool_jwt(token)  # memoized per token in app.utils.auth
+        except ValueError as e:
+            raise HTTPException(status_code=401, detail=f"Auth failed: {e}")
+        if needed_scope not in (payload.get("scp") or []):
+            raise HTTPException(status_code=403, detail=f"Scope '{needed_scope}' required")
+        return payload
+    return _dep
+
+
+def _require_session(payload: Dict[str, Any], session_id: str) -> None:
     if payload.get("sid") != session_id:
         raise HTTPException(status_code=403, detail="Session mismatch")
-    if needed_scope not in (payload.get("scp") or []):
-        raise HTTPException(status_code=403, detail=f"Scope '{needed_scope}' required")
-    return True
 
 
 
@@ -57,33 +69,44 @@ class FinalizeBody(BaseModel):
 
 # ---- endpoints ------------------------------------------------------
 @router.post("/tools/reply")
-async def tools_reply(body: ReplyBody, authorization: Optional[str] = Header(default=None)):
-    _require_auth(authorization, needed_scope="reply", session_id=body.session_id)
+async def tools_reply(body: ReplyBody, auth: Dict[str, Any] = Depends(require_scope("reply"))):
+    _require_session(auth, body.session_id)
     try:
-        out = await handle_summary_reply(body.dict())
-        return out
+        out = await handle_summary_reply(
+            session_id=body.session_id,
+            latest_user_text=body.latest_user_text,
+            locale=body.locale,
+        )
+        return orjson_response(out)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Tool 'reply' failed: {e}")
 
 
 @router.post("/tools/objective")
-async def tools_objective(body: ObjectiveBody, authorization: Optional[str] = Header(default=None)):
-    _require_auth(authorization, needed_scope="objective", session_id=body.session_id)
+async def tools_objective(body: ObjectiveBody, auth: Dict[str, Any] = Depends(require_scope("objective"))):
+    _require_session(auth, body.session_id)
     try:
-        out = await handle_summary_objective(body.dict())
-        return out
+        out = await handle_summary_objective(session_id=body.session_id, locale=body.locale)
+        return orjson_response(out)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Tool 'objective' failed: {e}")
 
 
 @router.post("/tools/finalize")
-async def tools_finalize(body: FinalizeBody, authorization: Optional[str] = Header(default=None)):
-    _require_auth(authorization, needed_scope="finalize", session_id=body.session_id)
+async def tools_finalize(body: FinalizeBody, auth: Dict[str, Any] = Depends(require_scope("finalize"))):
+    _require_session(auth, body.session_id)
     try:
-        out = await handle_summary_finalize(body.dict())
-        return out
+        out = await handle_summary_finalize(
+            session_id=body.session_id,
+            preview_only=body.preview_only,
+            locale=body.locale,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Tool 'finalize' failed: {e}")
+    # Snapshot not ready (504) / failed (500): surface it like /summary/finalize
+    if out.get("status_code") in (500, 504):
+        raise HTTPException(status_code=out["status_code"], detail=out.get("message"))
+    return orjson_response(out)
     
 
 
@@ -1,12 +1,12 @@
 # app/routes/visits.py
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Response
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Dict, Any
 
 from app.services.visit_logger import VisitLoggerService
+from app.utils.responses import orjson_response
 
 router = APIRouter(prefix="/visits", tags=["visits"])
 visit_logger = VisitLoggerService()
@@ -17,24 +17,28 @@ class FeedbackLogRequest(BaseModel):
     patient_id: int
     treatment: str
     feedback: str
-    # accepts "2025-10-09 22:00:00" and other ISO-like strings
-    datetime: datetime
+    # accepts "2025-10-09 22:00:00" or "2025-10-09T22:00:00"; kept as a string
+    # (JSON key stays "datetime") since the table wants exactly that text back
+    datetime_iso: Annotated[
+        str, StringConstraints(pattern=r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}$")
+    ] = Field(alias="datetime")
     is_severe: bool
     feedback_type: str
 
 
 # Keep the old path if you like; it now logs to patient_feedback
-@router.post("/log-visit")
-async def create_feedback_log(body: FeedbackLogRequest) -> Dict[str, Any]:
+@router.post("/log-visit", response_model=Dict[str, Any])
+async def create_feedback_log(body: FeedbackLogRequest) -> Response:
     try:
-        # pass values through; format datetime exactly as table expects
-        return await visit_logger.log_feedback(
+        # pass values through; table expects "YYYY-MM-DD HH:MM:SS"
+        out = await visit_logger.log_feedback(
             patient_id=body.patient_id,
             treatment=body.treatment,
             feedback=body.feedback,
-            datetime_iso=body.datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            datetime_iso=body.datetime_iso.replace("T", " "),
             is_severe=body.is_severe,
             feedback_type=body.feedback_type,
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    return orjson_response(out)
\ No newline at end of file
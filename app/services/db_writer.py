@@ -2,12 +2,49 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict
 import httpx
 
 DB_WRITE_URL = os.getenv("DB_WRITE_URL") or ""
 DB_API_KEY  = os.getenv("DB_API_KEY") or ""
 
+# Built once: static headers + one pooled client reused for every write
+# (keep-alive avoids a fresh TCP/TLS handshake per feedback row).
+_headers_base: Dict[str, str] = {"Content-Type": "application/json"}
+if DB_API_KEY.strip():
+    # adjust if they told you to use a different header
+    _headers_base["x-api-key"] = DB_API_KEY.strip()
+    # or: _headers_base["Authorization"] = f"Bearer {DB_API_KEY.strip()}"
+
+_client = httpx.AsyncClient(
+    timeout=20.0,
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    http2=True,
+)
+
+
+async def aclose() -> None:
+    """Close the pooled client (called on app shutdown)."""
+    await _client.aclose()
+
+
+async def _post_row(payload: Dict[str, Any]) -> Dict[str, Any]:
+    resp = await _client.post(DB_WRITE_URL, json=payload, headers=_headers_base)
+
+    ok = resp.status_code in (200, 201)
+    # Log status only; the row itself is patient data.
+    print(f"[DB_WRITE] status={resp.status_code} patient_id={payload.get('patient_id')}")
+    if ok:
+        return {"ok": True, "status_code": resp.status_code}
+
+    # Try to decode JSON; fall back to raw text for debugging
+    try:
+        body: Any = resp.json()
+    except Exception:
+        body = resp.text
+    return {"ok": False, "status_code": resp.status_code, "error": body}
+
+
 async def write_feedback_row(
     *,
     patient_id: int,
@@ -31,26 +68,4 @@ async def write_feedback_row(
         "feedback_type": feedback_type,
     }
 
-    headers: Dict[str, str] = {"Content-Type": "application/json"}
-    if DB_API_KEY.strip():
-        # adjust if they told you to use a different header
-        headers["x-api-key"] = DB_API_KEY.strip()
-        # or: headers["Authorization"] = f"Bearer {DB_API_KEY.strip()}"
-
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.post(DB_WRITE_URL, json=payload, headers=headers)
-
-    # Try to decode JSON; fall back to raw text for debugging
-    try:
-        body: Any = resp.json()
-    except Exception:
-        body = await resp.aread()
-
-    return {
-        "ok": resp.status_code in (200, 201),
-        "status_code": resp.status_code,
-        "url": DB_WRITE_URL,
-        "payload": payload,
-        "body": body,
-        "headers_used": list(headers.keys()),
-    }
\ No newline at end of file
+    return await _post_row(payload)
@@ -1,9 +1,12 @@
 # app/services/realtime_tool_handlers.py
-from typing import Dict, Any, Optional, List, Iterable
-import json
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+import asyncio
+import os
 import re
+from collections import OrderedDict
+import orjson
 from app.models.summary import MessageTurn
-from app.clients.reasoning_client import ReasoningClient
+from app.clients.reasoning_client import get_reasoning_client
 from app.services.summary_session import (
     get_session,
     create_session,
@@ -14,9 +17,63 @@ from app.services.summary_session import (
 # -----------------------------------------------------------------------------
 # In-memory notes store (MVP)
 # -----------------------------------------------------------------------------
-NOTES_BY_SESSION: Dict[str, str] = {}
+# LRU-bounded: the least recently touched session is dropped past MAX_SESSIONS,
+# so worst case is ~MAX_SESSIONS * _MAX_NOTES_LEN chars.
+# Values are (text, has_newline) so append_notes can pick its joiner without
+# re-scanning the whole buffer.
+NOTES_BY_SESSION: "OrderedDict[str, Tuple[str, bool]]" = OrderedDict()
+MAX_SESSIONS = int(os.getenv("MAX_NOTES_SESSIONS", "10000"))
 _MAX_NOTES_LEN = 12000
-reason_client = ReasoningClient()
+_PARA_RE = re.compile(r"\n\s*\n")  # blank line(s) between paragraphs
+_WS_RE = re.compile(r"\s+")
+# Anything _normalize would change: a whitespace run, non-space whitespace
+# (newline/tab/...), or leading/trailing whitespace. No match -> already normal.
+_NEEDS_NORM_RE = re.compile(r"\s\s|[^\S ]|^\s|\s$")
+reason_client = get_reasoning_client()
+
+
+def _coerce_dict(raw: Dict[Any, Any]) -> str:
+    parts: List[str] = []
+    for key, value in raw.items():
+        if value is None or value == "":
+            continue
+        label = str(key).replace("_", " ").capitalize()
+        if isinstance(value, (dict, list)):
+            pretty = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        else:
+            pretty = str(value)
+        parts.append(f"{label}: {pretty}")
+    return "\n".join(parts)
+
+
+def _coerce_seq(raw: Iterable[Any]) -> str:
+    pieces = []
+    for item in raw:
+        text = _coerce_notes_input(item)
+        if text:
+            pieces.append(text)
+    return "\n".join(pieces)
+
+
+def _coerce_other(raw: Any) -> str:
+    # Subclasses (OrderedDict, str enums, ...) and other iterables land here.
+    if isinstance(raw, str):
+        return raw
+    if isinstance(raw, dict):
+        return _coerce_dict(raw)
+    if isinstance(raw, Iterable) and not isinstance(raw, (bytes, bytearray)):
+        return _coerce_seq(raw)
+    return str(raw)
+
+
+# Exact-type dispatch for the common payload shapes; everything else -> _coerce_other
+_COERCERS = {
+    type(None): lambda _: "",
+    str: lambda x: x,
+    dict: _coerce_dict,
+    list: _coerce_seq,
+    tuple: _coerce_seq,
+}
 
 
 def _coerce_notes_input(raw: Any) -> str:
@@ -25,30 +82,7 @@ def _coerce_notes_input(raw: Any) -> str:
     a human-readable string for storage/display. This guards against models
     sending structured objects instead of plain text.
     """
-    if raw is None:
-        return ""
-    if isinstance(raw, str):
-        return raw
-    if isinstance(raw, dict):
-        parts: List[str] = []
-        for key, value in raw.items():
-            if value is None or value == "":
-                continue
-            label = str(key).replace("_", " ").capitalize()
-            if isinstance(value, (dict, list)):
-                pretty = json.dumps(value, ensure_ascii=False, separators=(", ", ": "))
-            else:
-                pretty = str(value)
-            parts.append(f"{label}: {pretty}")
-        return "\n".join(parts)
-    if isinstance(raw, Iterable) and not isinstance(raw, (bytes, bytearray)):
-        pieces = []
-        for item in raw:
-            text = _coerce_notes_input(item)
-            if text:
-                pieces.append(text)
-        return "\n".join(pieces)
-    return str(raw)
+    return _COERCERS.get(type(raw), _coerce_other)(raw)
 
 
 def _cap(text: str) -> str:
@@ -64,24 +98,44 @@ def _normalize(text: str) -> str:
     """
     if text is None:
         return ""
-    paragraphs = re.split(r"\n\s*\n", text.strip())  # split on blank lines
+    if _NEEDS_NORM_RE.search(text) is None:
+        return text  # single-spaced one-liner: nothing to collapse
+    paragraphs = _PARA_RE.split(text.strip())  # split on blank lines
     cleaned = []
     for p in paragraphs:
-        cleaned.append(re.sub(r"\s+", " ", p.strip()))  # collapse internal whitespace
+        cleaned.append(_WS_RE.sub(" ", p.strip()))  # collapse internal whitespace
     return "\n\n".join([c for c in cleaned if c])
 
 
+def _get_entry(session_id: str) -> Tuple[str, bool]:
+    entry = NOTES_BY_SESSION.get(session_id)
+    if entry is None:
+        return "", False
+    NOTES_BY_SESSION.move_to_end(session_id)
+    return entry
+
+
 def get_notes(session_id: str) -> str:
-    return NOTES_BY_SESSION.get(session_id, "")
+    return _get_entry(session_id)[0]
+
+
+def _put_notes(session_id: str, notes: str, has_newline: bool) -> None:
+    if len(notes) > _MAX_NOTES_LEN:
+        notes = _cap(notes)
+        has_newline = has_newline and "\n" in notes  # the cut may drop the only break
+    NOTES_BY_SESSION[session_id] = (notes, has_newline)
+    NOTES_BY_SESSION.move_to_end(session_id)
+    if len(NOTES_BY_SESSION) > MAX_SESSIONS:
+        NOTES_BY_SESSION.popitem(last=False)
 
 
 def set_notes(session_id: str, notes: str) -> Dict[str, Any]:
-    txt = _normalize(_coerce_notes_input(notes))
-    NOTES_BY_SESSION[session_id] = _cap(txt)
+    text = _normalize(_coerce_notes_input(notes))
+    _put_notes(session_id, text, "\n" in text)
     return {
         "ok": True,
         "session_id": session_id,
-        "len": len(NOTES_BY_SESSION[session_id]),
+        "len": len(NOTES_BY_SESSION[session_id][0]),
         "message": "Notes overwritten.",
     }
 
@@ -89,16 +143,17 @@ def set_notes(session_id: str, notes: str) -> Dict[str, Any]:
 def append_notes(session_id: str, delta: str) -> Dict[str, Any]:
     if not delta:
         return {"ok": True, "session_id": session_id, "len": len(get_notes(session_id))}
-    existing = get_notes(session_id)
+    existing, existing_nl = _get_entry(session_id)
     chunk = _normalize(delta or "")
+    chunk_nl = "\n" in chunk  # only the delta is scanned; existing_nl is stored
     # If no existing, just set; else add a space/newline as needed
-    joiner = "\n" if ("\n" in existing or "\n" in chunk) else " "
+    joiner = "\n" if (existing_nl or chunk_nl) else " "
     new_val = (existing + (joiner if existing else "") + chunk).strip()
-    NOTES_BY_SESSION[session_id] = _cap(new_val)
+    _put_notes(session_id, new_val, existing_nl or chunk_nl)
     return {
         "ok": True,
         "session_id": session_id,
-        "len": len(NOTES_BY_SESSION[session_id]),
+        "len": len(NOTES_BY_SESSION[session_id][0]),
         "message": "Notes appended.",
     }
 
@@ -111,7 +166,7 @@ async def save_observation(session_id: str, notes: str) -> Dict[str, Any]:
     normalized_input = _coerce_notes_input(notes)
     print(f"[OBS] save_observation called session={session_id} notes_len={len(normalized_input)}")
     data = set_notes(session_id, normalized_input)
-    normalized = NOTES_BY_SESSION.get(session_id, "")
+    normalized = get_notes(session_id)
     try:
         set_working_notes(session_id, normalized)
     except KeyError:
@@ -150,7 +205,7 @@ async def finalize_soap(session_id: str) -> Dict[str, Any]:
             set_working_notes(session_id, notes)
         sess = summary
 
-    turns: List[MessageTurn] = list(sess.turns)
+    turns: List[MessageTurn] = sess.turns  # read-only below; no copy needed
     if not turns:
         notes = get_working_notes(session_id) or get_notes(session_id)
         if notes:
@@ -158,11 +213,30 @@ async def finalize_soap(session_id: str) -> Dict[str, Any]:
                 MessageTurn(role="assistant", content=notes, modality="text")
             ]
 
+    # Wait (bounded) for a warm-up started by /summary/start; same 504/500 split
+    # as the summary routes, reported in the result dict instead of raised
+    try:
+        snapshot = await sess.wait_snapshot()
+    except asyncio.TimeoutError:
+        return {
+            "ok": False,
+            "status_code": 504,
+            "message": "Snapshot still warming; try again",
+            "session_id": session_id,
+        }
+    except Exception as e:
+        return {
+            "ok": False,
+            "status_code": 500,
+            "message": f"Error building snapshot: {e}",
+            "session_id": session_id,
+        }
+
     try:
         print(f"[FINALIZE] calling reasoning for session={session_id}")
         result = await reason_client.generate_summary_finalize(
             turns=turns or [],
-            snapshot=sess.snapshot or {},
+            snapshot=snapshot or {},
             locale=sess.locale or "en",
             preview_only=True,
         )
@@ -199,7 +273,7 @@ async def handle_summary_reply(
 ) -> Dict[str, Any]:
     """
     Update the working notes when the agent/user "replies".
-    tools.py passes a pydantic body with: { session_id, latest_user_text, locale }
+    tools.py passes the body fields as keywords: session_id, latest_user_text, locale
     Default behavior: append the text into the notes buffer.
     """
     if payload and isinstance(payload, dict):
@@ -270,7 +344,7 @@ async def handle_summary_finalize(
     if not session_id:
         return {"ok": False, "message": "session_id required"}
 
-    draft_result = finalize_soap(session_id)
+    draft_result = await finalize_soap(session_id)
     # In a real pipeline, if preview_only is False, you'd also save it here.
     draft_result.update({
         "preview_only": bool(preview_only),
@@ -5,10 +5,12 @@ from typing import Any, Dict, List
 from datetime import datetime
 import httpx
 import asyncio
+from async_lru import alru_cache
 
 BASE = os.getenv("E_HOSPITAL_BASE_URL", "").rstrip("/")
 if not BASE:
     raise RuntimeError("E_HOSPITAL_BASE_URL not set. Add it to your .env and restart the server.")
+SNAPSHOT_CACHE_TTL = float(os.getenv("SNAPSHOT_CACHE_TTL_SEC", "30"))
 
 # --- helpers ---
 def _parse_dt(x: Any) -> datetime:
@@ -103,4 +105,12 @@ async def build_snapshot(patient_id: int) -> Dict[str, Any]:
         "allergies": ar_trim,        # now includes recent reactions
         "labs": lb_trim,
         "diagnoses": dx_trim
-    }
\ No newline at end of file
+    }
+
+# --- cached entry point ---
+# Concurrent sessions for the same patient (voice intake + REST previews) share one
+# fetch; the short TTL keeps the EHR view fresh. Failures are not cached.
+# Callers must treat the returned dict as read-only (it is shared).
+@alru_cache(maxsize=1024, ttl=SNAPSHOT_CACHE_TTL)
+async def build_snapshot_cached(patient_id: int) -> Dict[str, Any]:
+    return await build_snapshot(patient_id)
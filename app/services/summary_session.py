@@ -7,20 +7,35 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Literal
-from datetime import datetime, timezone
-from uuid import uuid4  # used later when we add create_session()
-from pydantic import BaseModel, Field
+import asyncio
+import os
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional, Literal, Sequence, TypeVar
+from datetime import datetime
 from uuid import uuid4
 
-
-from app.models.summary import MessageTurn, ResponseEnvelope
+from app.models.summary import MessageTurn
 from app.models.transcript import Transcript
 from app.utils.time import now_et
 
-class SummarySession(BaseModel):
-    '''
-     Identifier:
+T = TypeVar("T")
+
+CONTEXT_TURNS = 20          # turns kept verbatim in the packed reasoning context
+HISTORY_TRIGGER_TURNS = 12  # summarize once this many turns sit past the summary
+HISTORY_KEEP_RAW = 8        # newest turns always left verbatim
+SNAPSHOT_WAIT_SEC = 5.0     # max wait for a warming snapshot before a request gives up
+
+_EMPTY: tuple = ()  # shared placeholder for not-yet-used turns/transcripts
+
+
+@dataclass(slots=True)
+class SessionState:
+    """
+    What _SESSIONS stores: one slotted dataclass per session (no per-instance
+    __dict__, no pydantic attribute machinery on the hot path).
+
+    Identifier:
       - session_id: opaque UUID for the session (set when created)
       - patient_id: EHR patient integer id (we locked this choice earlier)
       - doctor_id:  optional clinician/staff id for attribution
@@ -39,27 +54,181 @@ class SummarySession(BaseModel):
     Light conversation state (optional but useful):
       - current_confidence: float in [0,1] reported by assistant on last turn
       - last_intent:        last assistant intent string (e.g., 'ask', 'answer')
-    '''
+      - doctor_msg_count:   running count of doctor turns (kept by add_doctor_message)
+
+    Save tracking:
+      - save_status: None | 'saving' | 'saved' | 'error' (approved /finalize)
+      - save_result: visit writer response, or {'error': ...} on failure
+
+    History memory:
+      - history_summary:      compact summary of turns[:summarized_up_to_idx]
+      - summarized_up_to_idx: turns before this index are covered by history_summary
+    """
 
     session_id: str
     patient_id: int
-    doctor_id: Optional[str] = None
     started_at: datetime
+    doctor_id: Optional[str] = None
     status: Literal["collecting", "finalized", "saved"] = "collecting"
     consent: bool = True
     locale: str = "en"
 
-    turns: List[MessageTurn] = Field(default_factory=list)
-    transcripts: List[Transcript] = Field(default_factory=list)
-    snapshot: dict = Field(default_factory=dict)
+    # Shared empty tuple until the first append (many tool-call sessions never
+    # get a turn or transcript); _append_* swaps in a real list on first use.
+    turns: Sequence[MessageTurn] = _EMPTY
+    transcripts: Sequence[Transcript] = _EMPTY
+    snapshot: dict = field(default_factory=dict)
     working_notes: str = ""
 
     current_confidence: Optional[float] = None
     last_intent: Optional[str] = None
-
-
-
-_SESSIONS: Dict[str, SummarySession] = {}  # class-level in-memory store for sessions
+    doctor_msg_count: int = 0
+
+    # Background DB save after an approved /finalize
+    save_status: Optional[Literal["saving", "saved", "error"]] = None
+    save_result: Optional[dict] = None
+
+    history_summary: str = ""
+    summarized_up_to_idx: int = 0
+
+    # Rolling "Doctor: ..." / "Assistant: ..." lines for the reasoning context,
+    # appended as turns arrive so /reply and /run don't re-format every call.
+    _recent_lines: Deque[str] = field(init=False, repr=False, default_factory=lambda: deque(maxlen=CONTEXT_TURNS))
+    _ctx_cache: str = field(init=False, repr=False, default="")
+    _ctx_dirty: bool = field(init=False, repr=False, default=False)
+    _history_task: Optional[asyncio.Task] = field(init=False, repr=False, default=None)
+
+    # Background snapshot warm-up (set by start_snapshot_warm; None = snapshot given up front)
+    _snapshot_ready: Optional[asyncio.Event] = field(init=False, repr=False, default=None)
+    _snapshot_task: Optional[asyncio.Task] = field(init=False, repr=False, default=None)
+    _snapshot_error: Optional[BaseException] = field(init=False, repr=False, default=None)
+    _snapshot_fetch: Optional[Callable[[int], Awaitable[dict]]] = field(init=False, repr=False, default=None)
+
+    # In-flight request tasks keyed by (endpoint, text), for single_flight()
+    _inflight: Dict[Hashable, asyncio.Task] = field(init=False, repr=False, default_factory=dict)
+
+    def _append_turn(self, turn: MessageTurn) -> None:
+        if self.turns is _EMPTY:
+            self.turns = []
+        self.turns.append(turn)
+
+    def _append_transcript(self, t: Transcript) -> None:
+        if self.transcripts is _EMPTY:
+            self.transcripts = []
+        self.transcripts.append(t)
+
+    def _push_context_line(self, who: str, content: str) -> None:
+        self._recent_lines.append(f"{who}: {content}")
+        self._ctx_dirty = True
+
+    def pack_context(self, max_chars: int = 8000) -> str:
+        """
+        Latest conversation packaging for the reasoning model:
+        '[History]: ...' (once older turns are summarized) followed by the
+        turns not yet covered by it, trimmed from the front to stay under
+        a conservative char budget.
+        """
+        if self._ctx_dirty:
+            raw = min(len(self.turns) - self.summarized_up_to_idx, len(self._recent_lines))
+            lines = list(self._recent_lines)[-raw:] if raw > 0 else []
+            head = f"[History]: {self.history_summary}\n" if self.history_summary else ""
+            self._ctx_cache = head + "\n".join(lines)
+            self._ctx_dirty = False
+        if len(self._ctx_cache) <= max_chars:
+            return self._ctx_cache
+        return self._ctx_cache[-max_chars:]
+
+    def maybe_refresh_history(self, summarize: Callable[..., Awaitable[str]]) -> None:
+        """
+        Once more than HISTORY_TRIGGER_TURNS turns sit past the summary, fold
+        all but the newest HISTORY_KEEP_RAW of them into history_summary in
+        the background. `summarize(turns, previous_summary=...)` returns the
+        new summary text. At most one refresh runs per session at a time;
+        on failure the old summary (and raw turns) simply stay in use.
+        """
+        start = self.summarized_up_to_idx
+        end = len(self.turns) - HISTORY_KEEP_RAW
+        if len(self.turns) - start <= HISTORY_TRIGGER_TURNS:
+            return
+        if self._history_task is not None and not self._history_task.done():
+            return
+
+        older = self.turns[start:end]
+        previous = self.history_summary
+
+        async def _run() -> None:
+            try:
+                summary = await summarize(older, previous_summary=previous)
+            except Exception as e:
+                print(f"[HISTORY] summarize failed for {self.session_id}: {e}")
+                return
+            if summary:
+                self.history_summary = summary
+                self.summarized_up_to_idx = end
+                self._ctx_dirty = True
+
+        self._history_task = asyncio.create_task(_run())
+
+    def start_snapshot_warm(self, fetch: Callable[[int], Awaitable[dict]]) -> None:
+        """
+        Build the patient snapshot in the background so /summary/start can
+        return right away. `fetch(patient_id)` returns the snapshot dict;
+        a failure is reported to the waiters of this attempt, and the next
+        wait_snapshot() starts a fresh fetch.
+        """
+        ready = asyncio.Event()
+        self._snapshot_fetch = fetch
+        self._snapshot_error = None
+
+        async def _run() -> None:
+            try:
+                self.snapshot = await fetch(self.patient_id) or {}
+            except Exception as e:
+                print(f"[SNAPSHOT] warm failed for {self.session_id}: {e}")
+                self._snapshot_error = e
+            finally:
+                ready.set()
+
+        self._snapshot_ready = ready
+        self._snapshot_task = asyncio.create_task(_run())
+
+    async def single_flight(self, key: Hashable, run: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `run()` once per key at a time: a concurrent caller with the same
+        key awaits the first caller's task (result or exception) instead.
+        The entry is dropped when the task finishes, so later calls run fresh.
+        """
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(run())
+            self._inflight[key] = task
+            task.add_done_callback(
+                lambda t: self._inflight.pop(key, None) if self._inflight.get(key) is t else None
+            )
+        # shield: one caller disconnecting must not cancel the shared work
+        return await asyncio.shield(task)
+
+    async def wait_snapshot(self, timeout: float = SNAPSHOT_WAIT_SEC) -> dict:
+        """
+        Return the snapshot, waiting for a background warm-up if one is running.
+        Raises asyncio.TimeoutError if it isn't ready in time, or the fetch error.
+        A failed warm-up is retried here rather than failing the session for good.
+        """
+        if self._snapshot_error is not None and self._snapshot_fetch is not None:
+            print(f"[SNAPSHOT] retrying warm for {self.session_id}")
+            self.start_snapshot_warm(self._snapshot_fetch)
+        if self._snapshot_ready is not None and not self._snapshot_ready.is_set():
+            await asyncio.wait_for(self._snapshot_ready.wait(), timeout=timeout)
+        if self._snapshot_error is not None:
+            raise self._snapshot_error
+        return self.snapshot
+
+
+
+# class-level in-memory store for sessions; LRU-bounded so abandoned sessions
+# don't accumulate forever (least recently used is dropped past MAX_SESSIONS)
+_SESSIONS: "OrderedDict[str, SessionState]" = OrderedDict()
+MAX_SESSIONS = int(os.getenv("MAX_SUMMARY_SESSIONS", "10000"))
 
 ### creating mini functions to control that session state, create it, call it, add to it, etc.
 
@@ -72,13 +241,13 @@ def create_session(
     consent: bool,
     locale: str,
     snapshot: dict,
-) -> SummarySession:
+) -> SessionState:
     """
     Create and register a new session. Called from /summary/start.
-    Returns the validated SummarySession object.
+    Returns the stored SessionState.
     """
     sid = session_id or str(uuid4())
-    sess = SummarySession(
+    sess = SessionState(
         session_id=sid,
         patient_id=patient_id,
         doctor_id=doctor_id,
@@ -90,18 +259,22 @@ def create_session(
     )
 
     _SESSIONS[sid] = sess
+    _SESSIONS.move_to_end(sid)
+    if len(_SESSIONS) > MAX_SESSIONS:
+        _SESSIONS.popitem(last=False)
     return sess
 
-def get_session(session_id: str) -> SummarySession: 
+def get_session(session_id: str) -> SessionState: 
     """
     Retrieve a session by its ID. Raises KeyError if not found.
     """
     sess = _SESSIONS.get(session_id)
     if not sess:
         raise KeyError(f"Session {session_id} not found")
+    _SESSIONS.move_to_end(session_id)  # mark as recently used
     return sess
 
-def add_doctor_message(session_id: str, text: str, modality: Literal["text", "voice"] = "text") -> SummarySession:
+def add_doctor_message(session_id: str, text: str, modality: Literal["text", "voice"] = "text") -> SessionState:
     
     """
     Append a doctor turn to the conversation.
@@ -115,7 +288,9 @@ def add_doctor_message(session_id: str, text: str, modality: Literal["text", "vo
             content=clean,
             modality=modality
         )
-        sess.turns.append(turn)
+        sess._append_turn(turn)
+        sess.doctor_msg_count += 1
+        sess._push_context_line("Doctor", clean)
     return sess
 
 def add_assistant_reply(
@@ -125,7 +300,7 @@ def add_assistant_reply(
     modality: Literal["text", "voice"] = "text",
     confidence: Optional[float] = None,
     intent: Optional[str] = None,
-) -> SummarySession:
+) -> SessionState:
      """
     Append an assistant turn and (optionally) update light convo state.
     We typically store exactly what we *speak* back (speech-first).
@@ -134,7 +309,8 @@ def add_assistant_reply(
      clean = (content or "").strip()
      if clean:
         turn = MessageTurn(role="assistant", content=clean, modality=modality)
-        sess.turns.append(turn)
+        sess._append_turn(turn)
+        sess._push_context_line("Assistant", clean)
      if confidence is not None:
         sess.current_confidence = confidence
         if intent is not None:
@@ -142,18 +318,18 @@ def add_assistant_reply(
      return sess
     
 
-def add_transcript(session_id: str, t: Transcript) -> SummarySession:
+def add_transcript(session_id: str, t: Transcript) -> SessionState:
     """
     Append a normalized Transcript produced from an upload
     (audio/video -> ASR; text/plain -> direct ingest).
     """
     sess = get_session(session_id)
-    sess.transcripts.append(t)
+    sess._append_transcript(t)
     return sess
 
 # Lifecycle helpers
 
-def mark_finalized(session_id: str) -> SummarySession:
+def mark_finalized(session_id: str) -> SessionState:
     """
     Mark the session as finalized (no more doctor input).
     Called from /summary/finalize.
@@ -162,7 +338,7 @@ def mark_finalized(session_id: str) -> SummarySession:
     sess.status = "finalized"
     return sess
 
-def mark_saved(session_id: str) -> SummarySession:
+def mark_saved(session_id: str) -> SessionState:
     """
     Mark the session as saved (summary stored in EHR).
     Called from /summary/save.
@@ -172,7 +348,7 @@ def mark_saved(session_id: str) -> SummarySession:
     return sess
 
 
-def set_working_notes(session_id: str, notes: str) -> SummarySession:
+def set_working_notes(session_id: str, notes: str) -> SessionState:
     """
     Overwrite the rolling working notes for this session.
     """
@@ -2,10 +2,8 @@
 import os
 from typing import Dict, Any
 import httpx
-from dotenv import load_dotenv
-
-load_dotenv()
 
+# .env is loaded once at the entry point (app/main.py) before routes import this module.
 E_HOSPITAL_BASE_URL = os.getenv("E_HOSPITAL_BASE_URL", "https://aetab8pjmb.us-east-1.awsapprunner.com")
 VISIT_LOG_TABLE = os.getenv("VISIT_LOG_TABLE", "patient_feedback")
 VISIT_LOG_API_KEY = os.getenv("VISIT_LOG_API_KEY", "")  # optional
@@ -23,6 +21,19 @@ class VisitLoggerService:
         if VISIT_LOG_API_KEY:
             self.headers["apikey"] = VISIT_LOG_API_KEY
 
+        # One pooled keep-alive client per service (no TCP/TLS handshake per POST).
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=15.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled client (called on app shutdown)."""
+        await self._client.aclose()
+
     async def log_feedback(
         self,
         patient_id: int,
@@ -35,7 +46,7 @@ class VisitLoggerService:
         """
         Insert a feedback record into the patient_feedback table using POST /table/<table_name>.
         """
-        url = f"{self.base_url}/table/{VISIT_LOG_TABLE}"
+        path = f"/table/{VISIT_LOG_TABLE}"
         row = {
             "patient_id": patient_id,
             "treatment": treatment,
@@ -45,19 +56,17 @@ class VisitLoggerService:
             "feedback_type": feedback_type,
         }
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(url, json=row, headers=self.headers)
+        resp = await self._client.post(path, json=row)
+
+        ok = resp.status_code in (200, 201)
+        # Log status only; the row itself is patient data.
+        print(f"[VISIT_LOG] status={resp.status_code} patient_id={patient_id}")
+        if ok:
+            return {"ok": True, "status_code": resp.status_code}
 
         ctype = resp.headers.get("Content-Type", "")
         try:
             body = resp.json() if ctype.startswith("application/json") else resp.text
         except Exception:
             body = resp.text
-
-        return {
-            "ok": resp.status_code in (200, 201),
-            "status_code": resp.status_code,
-            "url": url,
-            "payload": row,
-            "body": body,
-        }
\ No newline at end of file
+        return {"ok": False, "status_code": resp.status_code, "error": body}
@@ -20,6 +20,14 @@ def _to_text(block: Any) -> str:
     return str(block)
 
 
+_FEEDBACK_LABELS = ("Subjective", "Objective", "Assessment", "Observation")
+
+
+def _labeled(label: str, text: str) -> str:
+    """'Label: text', or '' for an empty section (dropped by the join)."""
+    return f"{label}: {text}" if text else ""
+
+
 async def save_visit_if_ready(sess, js) -> Dict[str, Any]:
     """
     Persist the finalized SOAP/Observation into the E-Hospital patient_feedback table.
@@ -36,19 +44,12 @@ async def save_visit_if_ready(sess, js) -> Dict[str, Any]:
     plan = _to_text(soap.get("plan"))
 
     # Working notes saved via save_observation are stored on the session
-    observation = getattr(sess, "working_notes", "") or ""
+    observation = sess.working_notes or ""
 
     # Compose a concise feedback block for downstream analytics
-    feedback_parts = [
-        part for part in (
-            "Subjective: " + subjective if subjective else "",
-            "Objective: " + objective if objective else "",
-            "Assessment: " + assessment if assessment else "",
-            "Observation: " + observation if observation else "",
-        )
-        if part
-    ]
-    feedback_text = "\n\n".join(feedback_parts)
+    feedback_text = "\n\n".join(
+        filter(None, map(_labeled, _FEEDBACK_LABELS, (subjective, objective, assessment, observation)))
+    )
 
     treatment_text = plan or "Awaiting physician plan"
 
@@ -56,7 +57,8 @@ async def save_visit_if_ready(sess, js) -> Dict[str, Any]:
         patient_id=sess.patient_id,
         treatment=treatment_text,
         feedback=feedback_text or "SOAP summary generated",
-        datetime_iso=now_et().strftime("%Y-%m-%d %H:%M:%S"),
+        # "YYYY-MM-DD HH:MM:SS" (local ET, no offset) via C isoformat instead of strftime
+        datetime_iso=now_et().replace(microsecond=0, tzinfo=None).isoformat(" "),
         is_severe=False,
         feedback_type="soap_summary",
     )
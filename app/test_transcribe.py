@@ -2,18 +2,26 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 
-# Load .env
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-print("API key loaded?", api_key[:10] + "...")
 
-client = OpenAI(api_key=api_key)
+# Manual smoke test (billed API call): python -m app.test_transcribe
+# Kept behind __main__ so importing/collecting this module does no I/O.
+def main() -> None:
+    # Load .env
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    print("API key loaded?", api_key[:10] + "...")
 
-# Try a transcription call
-with open("Rideau St.m4a", "rb") as f:
-    resp = client.audio.transcriptions.create(
-        model="gpt-4o-mini-transcribe",
-        file=f
-    )
+    client = OpenAI(api_key=api_key)
 
-print("Transcription:", resp.text[:200])
+    # Try a transcription call
+    with open("Rideau St.m4a", "rb") as f:
+        resp = client.audio.transcriptions.create(
+            model="gpt-4o-mini-transcribe",
+            file=f
+        )
+
+    print("Transcription:", resp.text[:200])
+
+
+if __name__ == "__main__":
+    main()
@@ -10,46 +10,68 @@
 #   TOOL_JWT_TTL_SEC   - default 300s (5 min) tokens
 # -------------------------------------------------------------------
 import os, time, hmac, hashlib, base64, json
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
 
 
 SECRET = os.getenv("TOOL_JWT_SECRET", "dev-only-change-me")
 TTL    = int(os.getenv("TOOL_JWT_TTL_SEC", "300"))
+_SECRET_BYTES = SECRET.encode("utf-8")  # encoded once for every sign/verify
+# Keyed HMAC with the inner/outer pads already computed; .copy() per token.
+_BASE_HMAC = hmac.new(_SECRET_BYTES, digestmod=hashlib.sha256)
 
-def _b64url(data: bytes) -> str:
-    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+def _sign(signing_input: bytes) -> bytes:
+    h = _BASE_HMAC.copy()
+    h.update(signing_input)
+    return h.digest()
 
-def _b64url_json(obj: Dict[str, Any]) -> str:
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64url_json(obj: Dict[str, Any]) -> bytes:
     return _b64url(json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
 
 
+# Header never changes, so its base64 segment is computed once.
+_HEADER_B64 = _b64url_json({"alg": "HS256", "typ": "JWT"})
+
+@lru_cache(maxsize=1024)
+def _payload_template(session_id: str, scopes: Tuple[str, ...]) -> bytes:
+    """Payload JSON for (sid, scopes) with exp left as a %d slot; same UTF-8
+    bytes as _b64url_json's encoding of {"sid", "scp", "exp"}."""
+    prefix = json.dumps({"sid": session_id, "scp": list(scopes)}, separators=(",", ":"), ensure_ascii=False)
+    return prefix[:-1].replace("%", "%%").encode("utf-8") + b',"exp":%d}'
+
+
 def sign_tool_jwt(*, session_id: str, scopes: List[str]) -> str:
     """Create a compact HS256 JWT with {session_id, scopes, exp}."""
-    header = {"alg": "HS256", "typ": "JWT"}
-    payload = {
-        "sid": session_id,
-        "scp": scopes,
-        "exp": int(time.time()) + TTL
-    }
-    seg1 = _b64url_json(header)
-    seg2 = _b64url_json(payload)
-    signing_input = f"{seg1}.{seg2}".encode("ascii")
-    sig = hmac.new(SECRET.encode("utf-8"), signing_input, hashlib.sha256).digest()
-    seg3 = _b64url(sig)
-    return f"{seg1}.{seg2}.{seg3}"
+    payload_json = _payload_template(session_id, tuple(scopes)) % (int(time.time()) + TTL)
+    signing_input = _HEADER_B64 + b"." + _b64url(payload_json)
+    sig = _sign(signing_input)
+    return (signing_input + b"." + _b64url(sig)).decode("ascii")
 
-def verify_tool_jwt(token: str) -> Dict[str, Any]:
-    """Return decoded payload if valid, else raise ValueError."""
+@lru_cache(maxsize=1024)
+def _verify_uncached(token: str) -> bytes:
+    """Signature check + base64 decode, cached per token string (tokens are
+    immutable). Returns the verified payload JSON bytes; invalid tokens raise
+    and are not cached."""
     try:
         seg1, seg2, seg3 = token.split(".")
     except ValueError:
         raise ValueError("Malformed token")
     signing_input = f"{seg1}.{seg2}".encode("ascii")
-    expected = hmac.new(SECRET.encode("utf-8"), signing_input, hashlib.sha256).digest()
+    expected = _sign(signing_input)
     given = base64.urlsafe_b64decode(seg3 + "==")
     if not hmac.compare_digest(expected, given):
         raise ValueError("Invalid signature")
-    payload = json.loads(base64.urlsafe_b64decode(seg2 + "==").decode("utf-8"))
+    return base64.urlsafe_b64decode(seg2 + "==")
+
+def verify_tool_jwt(token: str) -> Dict[str, Any]:
+    """Return decoded payload if valid, else raise ValueError."""
+    # Parsed per call: every caller gets its own dict, so mutating it can't
+    # leak into later requests that hit the cache with the same token.
+    payload = json.loads(_verify_uncached(token).decode("utf-8"))
+    # exp is checked on every call, outside the cache
     if int(time.time()) > int(payload.get("exp", 0)):
         raise ValueError("Token expired")
-    return payload  # contains: sid (session_id), scp (scopes)
\ No newline at end of file
+    return payload  # contains: sid (session_id), scp (scopes)
@@ -12,22 +12,26 @@
 #       -> combines system + task with a separator and renders placeholders
 #
 # Placeholders use the form:  {{ variable_name }}
-# Dict/List values are pretty-printed as JSON automatically.
+# Dict/List values are pretty-printed as JSON automatically (orjson, 2-space indent).
 # ------------------------------------------------------------
 
-import json
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import orjson
+
 PROMPTS_DIR = Path(__file__).resolve().parents[1] / "prompts"
 
 # Match {{ var }} with optional whitespace
 _VAR_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
 
+@lru_cache(maxsize=32)
 def load_prompt(filename: str) -> str:
     """
     Load a single prompt file from app/prompts/<filename>.
+    Cached per filename (files are static); a missing file raises and is not cached.
     """
     path = PROMPTS_DIR / filename
     if not path.exists():
@@ -58,7 +62,7 @@ def _jsonify(val: Any) -> str:
     Convert dict/list to pretty JSON; otherwise cast to str.
     """
     if isinstance(val, (dict, list)):
-        return json.dumps(val, indent=2, ensure_ascii=False)
+        return orjson.dumps(val, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
     return str(val)
 
 def _apply_aliases(ctx: Dict[str, Any]) -> Dict[str, Any]:
@@ -74,6 +78,8 @@ def _substitute(template: str, ctx: Dict[str, Any]) -> str:
     """
     Perform {{ var }} substitution on a template using the given context.
     """
+    if "{{" not in template:
+        return template  # static prompt: nothing to substitute
 
     ctx = _apply_aliases(ctx)
 
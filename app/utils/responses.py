@@ -0,0 +1,10 @@
+# app/utils/responses.py
+from typing import Any, Dict
+
+import orjson
+from fastapi import Response
+
+
+def orjson_response(out: Dict[str, Any]) -> Response:
+    """Plain-dict result -> JSON response via orjson (no jsonable_encoder)."""
+    return Response(orjson.dumps(out, option=orjson.OPT_NON_STR_KEYS), media_type="application/json")
@@ -8,13 +8,50 @@
 # ------------------------------------------------------------
 
 import streamlit as st
+import orjson
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import time
+from collections import deque
 
 API = "http://127.0.0.1:8000/summary"
+JSON_HEADERS = {"Content-Type": "application/json"}  # bodies are pre-encoded with orjson
+TRANSCRIPT_MAX = 200  # older messages drop off the transcript panel
+ROLE_LABELS = {"doctor": "🧑‍⚕️ Doctor", "assistant": "🤖 Assistant"}
+
+@st.cache_resource(show_spinner=False)
+def get_http():
+    """One keep-alive pool per process, shared by every browser session.
+    Streamlit reruns the whole script on every click, so a bare
+    requests.post would reconnect each time. Kept synchronous on purpose:
+    each rerun makes at most one backend call, and /run already returns the
+    objective/SOAP previews, so there is nothing to gather."""
+    s = requests.Session()
+    # One quick retry smooths over a backend restart (refused / 502 / 503).
+    # No read retries and no 504: a POST that timed out or hit a gateway
+    # timeout may still have been processed, and resending would repeat it.
+    retry = Retry(
+        total=1, read=0, backoff_factor=0.2,
+        status_forcelist=[502, 503], allowed_methods=None,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
 
 st.set_page_config(page_title="AI-Triage-Homie", layout="wide", page_icon="🩺")
 st.title("🩺 AI-Triage-Homie — Doctor Summary Agent")
+http = get_http()
+
+def _post(path, body, read_to=30):
+    # (connect, read) timeouts so a stalled backend can't wedge the UI thread
+    return http.post(
+        f"{API}{path}",
+        data=orjson.dumps(body),
+        headers=JSON_HEADERS,
+        timeout=(2, read_to),
+    )
 
 # ------------------------------------------------------------
 # Session persistence
@@ -22,7 +59,9 @@ st.title("🩺 AI-Triage-Homie — Doctor Summary Agent")
 if "session_id" not in st.session_state:
     st.session_state.session_id = None
 if "transcript" not in st.session_state:
-    st.session_state.transcript = []
+    st.session_state.transcript = deque(maxlen=TRANSCRIPT_MAX)
+if "transcript_md" not in st.session_state:
+    st.session_state.transcript_md = ""  # rendered transcript, grown per message
 if "objective" not in st.session_state:
     st.session_state.objective = ""
 if "soap" not in st.session_state:
@@ -31,18 +70,17 @@ if "soap" not in st.session_state:
 # ------------------------------------------------------------
 # Layout sections
 # ------------------------------------------------------------
-col_chat, col_obs, col_soap = st.columns([2, 1, 1])
+col_chat, col_panels = st.columns([2, 2])
 with col_chat:
     st.subheader("Conversation Transcript")
     transcript_box = st.empty()
 
-with col_obs:
-    st.subheader("Observation (Objective)")
-    obs_box = st.empty()
-
-with col_soap:
-    st.subheader("Final SOAP Summary")
-    soap_box = st.empty()
+with col_panels:
+    head_obs, head_soap = st.columns(2)
+    head_obs.subheader("Observation (Objective)")
+    head_soap.subheader("Final SOAP Summary")
+    # Objective + SOAP share one slot, replaced as a unit in a single update
+    panel = st.empty()
 
 st.divider()
 
@@ -61,28 +99,38 @@ c1, c2 = st.columns([1, 1])
 start_btn = c1.button("▶️ Start Session")
 end_btn = c2.button("⏹️ End Session")
 
+def _now():
+    # HH:MM:SS without datetime.now()/strftime format parsing
+    t = time.localtime()
+    return f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
+
+def _format_line(t):
+    return f"**{ROLE_LABELS.get(t['role'], '🤖 Assistant')} ({t['time']}):** {t['text']}"
+
 def append_message(role, text):
-    st.session_state.transcript.append(
-        {"role": role, "text": text, "time": datetime.now().strftime("%H:%M:%S")}
-    )
+    t = {"role": role, "text": text, "time": _now()}
+    transcript = st.session_state.transcript
+    md = st.session_state.transcript_md
+    if len(transcript) == transcript.maxlen:
+        # deque is about to evict the oldest entry; drop its line (+ "\n") too
+        md = md[len(_format_line(transcript[0])) + 1:]
+    transcript.append(t)
+    # Append only the new line instead of re-joining the whole transcript
+    st.session_state.transcript_md = f"{md}\n{_format_line(t)}" if md else _format_line(t)
 
 def refresh_transcript():
-    chat = "\n".join(
-        [
-            f"**{'🧑‍⚕️ Doctor' if t['role']=='doctor' else '🤖 Assistant'} ({t['time']}):** {t['text']}"
-            for t in st.session_state.transcript
-        ]
-    )
-    transcript_box.markdown(chat or "_No messages yet._")
+    transcript_box.markdown(st.session_state.transcript_md or "_No messages yet._")
+
+def _panel_text(value):
+    # Formatted once when /run returns; reruns render the stored string as-is
+    return value if isinstance(value, str) else str(value or "")
 
 def reset_session_state():
     st.session_state.session_id = None
-    st.session_state.transcript.clear()
+    st.session_state.transcript = deque(maxlen=TRANSCRIPT_MAX)
+    st.session_state.transcript_md = ""
     st.session_state.objective = ""
     st.session_state.soap = ""
-    refresh_transcript()
-    obs_box.empty()
-    soap_box.empty()
 
 # Start session → /summary/start
 if start_btn:
@@ -93,7 +141,7 @@ if start_btn:
         "consent": consent,
     }
     try:
-        r = requests.post(f"{API}/start", json=payload)
+        r = _post("/start", payload)
         if r.status_code == 200:
             js = r.json()
             st.session_state.session_id = js["session_id"]
@@ -111,6 +159,7 @@ if end_btn:
 
 sid = st.session_state.session_id
 if not sid:
+    refresh_transcript()  # the tail render below is not reached
     st.stop()
 
 st.markdown(f"**Session ID:** `{sid}`")
@@ -126,12 +175,11 @@ if st.button("💾 Save Note"):
         st.warning("Please enter some text before saving.")
     else:
         try:
-            r = requests.post(f"{API}/message", json={"session_id": sid, "text": note_text})
+            r = _post("/message", {"session_id": sid, "text": note_text}, read_to=10)
             if r.status_code == 200:
                 js = r.json()
                 st.success(f"Note saved (total notes: {js['total_messages']})")
                 append_message("doctor", f"[Note] {note_text}")
-                refresh_transcript()
             else:
                 st.error(f"Failed to save note: {r.text}")
         except Exception as e:
@@ -146,10 +194,9 @@ user_input = st.chat_input("Speak or type your message to the assistant...")
 
 if user_input:
     append_message("doctor", user_input)
-    refresh_transcript()
 
     try:
-        r = requests.post(f"{API}/run", json={"session_id": sid, "text": user_input})
+        r = _post("/run", {"session_id": sid, "text": user_input}, read_to=90)
         if r.status_code == 200:
             js = r.json()
 
@@ -161,15 +208,13 @@ if user_input:
             ui = js.get("ui") or {}
             intent = js.get("intent", "")
             if "objective" in ui:
-                st.session_state.objective = ui["objective"]
+                st.session_state.objective = _panel_text(ui["objective"])
             if "soap" in ui:
-                st.session_state.soap = ui["soap"]
+                st.session_state.soap = _panel_text(ui["soap"])
 
             # Optional toast cue
             if intent in ["objective", "finalize", "show_preview"]:
                 st.toast(f"{intent.upper()} preview generated.", icon="📄")
-
-            refresh_transcript()
         else:
             st.error(f"Backend error: {r.text}")
     except Exception as e:
@@ -177,21 +222,27 @@ if user_input:
 
 # ------------------------------------------------------------
 # Render preview panels once (unique keys avoid duplicate ID errors)
+# Single transcript render per rerun; handlers above only update state.
 # ------------------------------------------------------------
 refresh_transcript()
 
-if st.session_state.objective:
-    obs_box.text_area(
-        "Observation",
-        value=st.session_state.objective,
-        height=250,
-        key="objective_view",  # unique key
-    )
-
-if st.session_state.soap:
-    soap_box.text_area(
-        "SOAP",
-        value=str(st.session_state.soap),
-        height=250,
-        key="soap_view",  # unique key
-    )
+# Panels are written on every rerun, changed or not: Streamlit drops any
+# element a rerun does not re-emit, so skipping an unchanged panel (dirty
+# flag / st.stop) would blank it. Unchanged values are diffed client-side.
+if st.session_state.objective or st.session_state.soap:
+    with panel.container():
+        c_obs, c_soap = st.columns(2)
+        if st.session_state.objective:
+            c_obs.text_area(
+                "Observation",
+                value=st.session_state.objective,
+                height=250,
+                key="objective_view",  # unique key
+            )
+        if st.session_state.soap:
+            c_soap.text_area(
+                "SOAP",
+                value=st.session_state.soap,
+                height=250,
+                key="soap_view",  # unique key
+            )
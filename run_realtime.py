@@ -6,39 +6,74 @@
 # 首先加载环境变量，在导入任何模块之前
 from dotenv import load_dotenv
 import os
+import sys
 load_dotenv()
 
+import anyio.to_thread
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-
-# 创建FastAPI应用
-app = FastAPI(title="Realtime Voice Chat", version="1.0.0")
-
-# 添加CORS中间件
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# 导入realtime路由
-from app.realtime.ws import router as realtime_router
-app.include_router(realtime_router, prefix="/realtime", tags=["realtime"])
-
-# 添加静态文件服务，用于提供HTML页面
-@app.get("/")
-async def serve_demo():
-    """提供realtime demo页面"""
-    return FileResponse("app/realtime/realtime_demo.html")
-
-@app.get("/health")
-async def health():
-    return {"status": "ok", "message": "Realtime service is running"}
+from fastapi.responses import Response
+
+# ENV=dev（默认）: 单进程 + reload；其他值: 多 worker，无文件监控
+DEV = os.getenv("ENV", "dev") == "dev"
+WORKERS = 1 if DEV else int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# AnyIO 线程池大小（默认 40），路由中的同步代码在此运行
+THREAD_TOKENS = int(os.getenv("ANYIO_THREAD_TOKENS", "100"))
+
+# 演示页面启动时读入内存一次，之后每次请求不再访问磁盘
+DEMO_HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app", "realtime", "realtime_demo.html")
+
+
+def _load_demo_html():
+    try:
+        with open(DEMO_HTML_PATH, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        print(f"[WARN] demo page not found: {DEMO_HTML_PATH}")
+        return None
+
+
+def create_app() -> FastAPI:
+    """应用工厂：由 uvicorn 在每个 worker 中调用（factory=True）。
+    realtime 路由（音频 / LLM 客户端等重依赖）在这里才导入，
+    reload/多 worker 的主进程只负责监控，不再加载它们。"""
+    from app.realtime.ws import router as realtime_router
+
+    # 创建FastAPI应用
+    app = FastAPI(title="Realtime Voice Chat", version="1.0.0")
+
+    @app.on_event("startup")
+    async def _raise_thread_limit():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREAD_TOKENS
+
+    # 添加CORS中间件（明确来源 + max_age，浏览器可缓存预检结果一天）
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[os.getenv("WEB_ORIGIN", "http://localhost:8000")],
+        allow_methods=["GET", "POST"],
+        allow_headers=["content-type", "authorization"],
+        max_age=86400,
+    )
+
+    # 导入realtime路由
+    app.include_router(realtime_router, prefix="/realtime", tags=["realtime"])
+
+    demo_html = _load_demo_html()
+
+    # 添加静态文件服务，用于提供HTML页面
+    @app.get("/")
+    async def serve_demo():
+        """提供realtime demo页面"""
+        if demo_html is None:
+            return Response("demo page not found", status_code=404, media_type="text/plain")
+        return Response(demo_html, media_type="text/html", headers={"Cache-Control": "public, max-age=300"})
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "message": "Realtime service is running"}
+
+    return app
 
 if __name__ == "__main__":
     print("🚀 启动Realtime语音对话服务...")
@@ -46,11 +81,19 @@ if __name__ == "__main__":
     print("🔗 WebSocket端点: ws://localhost:8000/realtime/ws/talk")
     print("💡 确保已安装所有依赖: pip install -r requirements.txt")
     print("🔑 确保.env文件中配置了OPENAI_API_KEY")
+    # 多 worker 时 WebSocket 会话只存在于单个进程内，反向代理需开启粘性会话
+    # （如 Nginx ip_hash），否则重连可能落到其他 worker。
     
     uvicorn.run(
-        "run_realtime:app",
+        "run_realtime:create_app",
+        factory=True,
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        reload=DEV,
+        workers=WORKERS,
+        log_level="info",
+        # uvloop 事件循环 + httptools C 解析器（Windows 无 uvloop，回退 auto）
+        loop="auto" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
     )
\ No newline at end of file